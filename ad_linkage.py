@@ -1,14 +1,114 @@
 from manim import *
 import numpy as np
 
+from ad_stream import first_component_ads
+from components import AdCard, AttributeNode, EdgeFollower, ring_positions
+from labels import label
+from layout import force_layout
+from linkage import AdRecord, LinkageEngine
+from render_driver import step
+
+# The two-ad demo used when no scraped ads are passed in
+DEFAULT_ADS = [
+    AdRecord("Escort Ad 1", "Example Ad Text", "XXX-XXX-XXXX", ("img-a", "img-b")),
+    AdRecord("Escort Ad 2", "Example Ad Text", "XXX-XXX-XXXX", ("img-c",)),
+]
+
 class AdLinkingVisualization(Scene):
-    def __init__(self, **kwargs):
+    def __init__(self, ads=None, **kwargs):
         super().__init__(**kwargs)
         # Define colors as instance variables so they're available in all methods
         self.node_color = "#2C73D2"
         self.text_node_color = "#FF6F61"
         self.highlight_color = "#27AE60"
+
+        # node -> incident edges, and edge -> (start node, end node), kept up to
+        # date as edges are created so merges never have to search for edges
+        self.incident_edges = {}
+        self.edge_ends = {}
+
+        # Link the ads up front so the scene animates whatever component comes out
+        self.engine = LinkageEngine()
+        self.engine.add_ads(DEFAULT_ADS if ads is None else ads)
+        self.select_linked_ads()
     
+    def select_linked_ads(self):
+        # Pick two directly linked ads from the largest component
+        pair = None
+        for component in self.engine.components(min_ads=2):
+            pair = self.engine.linking_pair(component)
+            if pair is not None:
+                break
+        if pair is None:
+            raise ValueError("No two ads share a phone number or image")
+        ad_a, ad_b, (kind, value) = pair
+        self.record1 = self.engine.records[ad_a]
+        self.record2 = self.engine.records[ad_b]
+        self.match_kind = kind
+        self.match_index1 = self.element_index(self.record1, kind, value)
+        self.match_index2 = self.element_index(self.record2, kind, value)
+
+    def element_index(self, record, kind, value):
+        # Element order is title, text, phone, then one element per image
+        if kind == "phone":
+            return 2
+        if kind == "text":
+            return 1
+        return 3 + record.image_hashes.index(value)
+
+    def node_label_text(self, i):
+        return ["Title", "Text", "Phone"][i] if i < 3 else f"Img{i-2}"
+
+    def connect(self, start_node, end_node, **kwargs):
+        # Create an edge between two nodes and register it in the adjacency index
+        edge = Line(start_node.get_center(), end_node.get_center(), **kwargs)
+        self.edge_ends[edge] = (start_node, end_node)
+        self.incident_edges.setdefault(start_node, []).append(edge)
+        self.incident_edges.setdefault(end_node, []).append(edge)
+        return edge
+
+    def following_edges(self, edges=None, moving=None):
+        # Context manager keeping edges (default all) attached to their nodes
+        edges = list(self.edge_ends) if edges is None else list(edges)
+        return EdgeFollower(self, edges, [self.edge_ends[e] for e in edges], moving)
+
+    def redirect_edges(self, old_node, new_node):
+        # Move every edge of old_node onto new_node, O(degree of old_node)
+        for edge in self.incident_edges.pop(old_node, []):
+            start_node, end_node = self.edge_ends[edge]
+            if start_node is old_node:
+                start_node = new_node
+            if end_node is old_node:
+                end_node = new_node
+            self.edge_ends[edge] = (start_node, end_node)
+            self.incident_edges.setdefault(new_node, []).append(edge)
+
+    def relayout_merged_graph(self, absorbed_node, merged_node, run_time=1):
+        # Force-directed layout over both graphs after the merge. The absorbed
+        # node has no edges left and simply follows the node it merged into.
+        nodes = [n for n in self.ad1_elements + self.ad2_elements if n is not absorbed_node]
+        labels = {n: l for n, l in zip(self.ad1_elements + self.ad2_elements, self.node_labels1 + self.node_labels2)}
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = [(index[a], index[b]) for a, b in self.edge_ends.values()]
+
+        current = np.array([n.get_center() for n in nodes])
+        # Collinear nodes give a zero extent, and a zero box collapses the
+        # layout; never go below one node diameter
+        diameter = max(n.width for n in nodes)
+        width, height = np.maximum(np.ptp(current[:, :2], axis=0), diameter)
+        target = np.zeros_like(current)
+        target[:, :2] = force_layout(len(nodes), edges, iterations=50, initial=current,
+                                     width=width, height=height)
+        targets = dict(zip(nodes, target))
+        targets[absorbed_node] = targets[merged_node]
+
+        with self.following_edges():
+            self.play(
+                *[node.animate.move_to(pos) for node, pos in targets.items()],
+                *[labels[node].animate.move_to(pos) for node, pos in targets.items()],
+                run_time=run_time
+            )
+
     def construct(self):
         # Step 1: Create the first ad box
         self.create_first_ad()
@@ -28,94 +128,45 @@ class AdLinkingVisualization(Scene):
         # Step 6: Merge the graphs
         self.merge_graphs()
     
-    def create_person_icon(self, height=1, width=1.5, color=WHITE):
-        # Create visible border box for the person icon
-        border = Rectangle(height=height, width=width, color=color)
-        
-        # Calculate proportions
-        head_radius = height * 0.2
-        body_width = width * 0.6
-        
-        # Head (circle)
-        head = Circle(radius=head_radius, color=color, fill_opacity=1)
-        head_position = border.get_top() + DOWN * head_radius * 1.5
-        head.move_to(head_position)
-        
-        # Body (semi-circle facing down)
-        
-        # Create body using a half-circle
-        # The body is a half-circle facing down
-        # The angle is set to PI (180 degrees)
-        body = Arc(radius=body_width/3, angle=PI, color=color, fill_opacity=1)
-        
-        # Move the body to the top of the head
-        body_top = head.get_bottom() + DOWN * 0.05  # Adjust the position slightly below the head
-        body.move_to(body_top)
+    def create_attribute_nodes(self, count, center):
+        # Title node in the text color, every other attribute in the node color,
+        # arranged on a circle around center
+        colors = [self.text_node_color] + [self.node_color] * (count - 1)
+        texts = [self.node_label_text(i) for i in range(count)]
+        return AttributeNode.batch(texts, colors, ring_positions(center, count, radius=1.5))
 
-        #body.move_to(body_top + DOWN * (body_width/2 - 0.05))
-        
-        # Create "Image" text label
-        image_label = Text("Image", font_size=18, color=color)
-        image_label.next_to(border, DOWN, buff=0.1)
-        
-        # Group everything including the border and label
-        person = VGroup(border, head, body, image_label)
-        
-        return person
-        
+    @step
     def create_first_ad(self):
         # Clear any previous text first        
-        step1_text = Text("We start with web scraped data of commerial sex ads.").scale(0.8).to_edge(UP)
+        step1_text = label("We start with web scraped data of commerial sex ads.").scale(0.8).to_edge(UP)
         self.play(Write(step1_text))
         self.step1_text = step1_text
         
-        # Create Ad 1 box
-        ad1_box = Rectangle(height=4, width=5, color=WHITE)
-        ad1_label = Text("Ad 1", color=WHITE).next_to(ad1_box, UP)
-        
-        # Ad content
-        ad_title = Text("Escort Ad 1", color=WHITE, font_size=24)
-        ad_text = Text("Example Ad Text", color=WHITE, font_size=20)
-        phone = Text("XXX-XXX-XXXX", color=WHITE, font_size=20)
-        
-        # Image placeholders with person icon
-        img1 = self.create_person_icon(1, 1.5, WHITE)
-        img2 = self.create_person_icon(1, 1.5, WHITE)
-        
-        # Position elements
-        ad_title.next_to(ad1_box.get_top(), DOWN, buff=0.3)
-        ad_text.next_to(ad_title, DOWN, buff=0.2)
-        phone.next_to(ad_text, DOWN, buff=0.2)
-        
-        img1.next_to(phone, DOWN, buff=0.2).shift(LEFT * 1)
-        img2.next_to(phone, DOWN, buff=0.2).shift(RIGHT * 1)
+        # Create Ad 1 box with its content
+        ad1 = AdCard(self.record1, header="Ad 1")
         
-        # Group all ad elements
-        ad1_content = VGroup(ad_title, ad_text, phone, img1, img2)
-        ad1_content.move_to(ad1_box.get_center())
-        
-        self.ad1_elements = [ad_title, ad_text, phone, img1, img2]
-        self.ad1_box = ad1_box
-        self.ad1_label = ad1_label
+        self.ad1_elements = ad1.elements
+        self.ad1_box = ad1.box
+        self.ad1_label = ad1.header
         
         # Show the ad
         self.play(
-            Create(ad1_box),
-            Write(ad1_label)
+            Create(ad1.box),
+            Write(ad1.header)
         )
         self.play(
-            Write(ad_title),
-            Write(ad_text),
-            Write(phone),
-            Create(img1),
-            Create(img2),
+            Write(ad1.title),
+            Write(ad1.text),
+            Write(ad1.phone),
+            *[Create(img) for img in ad1.images],
             run_time=2
         )
         self.wait()
     
+    @step
     def transform_ad_to_nodes(self):
         # Ensure the previous text is fully faded out before the new one appears
-        step2_text = Text("Each piece of information can \nbe represented as a data point.").scale(0.8).to_edge(UP)
+        step2_text = label("Each piece of information can \nbe represented as a data point.").scale(0.8).to_edge(UP)
         self.play(
             FadeOut(self.step1_text, run_time=0.5),
         )
@@ -124,36 +175,10 @@ class AdLinkingVisualization(Scene):
         )
         self.step2_text = step2_text
         
-        # Create nodes for each ad element
-        nodes = []
-        node_labels = []
-        
-        # Define node positions (in a circular arrangement)
-        center = self.ad1_box.get_center()
-        radius = 1.5
-        angles = np.linspace(0, 2 * np.pi, len(self.ad1_elements), endpoint=False)
-        positions = [center + radius * np.array([np.cos(angle), np.sin(angle), 0]) for angle in angles]
-        
-        # Pre-create all the circles and labels at the exact positions
-        for i, element in enumerate(self.ad1_elements):
-            if i == 0:  # Title node (will be the center node)
-                node = Circle(radius=0.4, color=self.text_node_color, fill_opacity=0.7)
-                label = Text("Title", font_size=16)
-            elif i == 1:  # Description
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text("Text", font_size=16)
-            elif i == 2:  # Phone
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text("Phone", font_size=16)
-            else:  # Images
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text(f"Img{i-2}", font_size=16)
-            
-            # Position the node and label precisely
-            node.move_to(positions[i])
-            label.move_to(node.get_center())
-            nodes.append(node)
-            node_labels.append(label)
+        # Create nodes for each ad element, in a circular arrangement
+        attribute_nodes = self.create_attribute_nodes(len(self.ad1_elements), self.ad1_box.get_center())
+        nodes = [n.circle for n in attribute_nodes]
+        node_labels = [n.text_label for n in attribute_nodes]
         
         # For a cleaner transition, fade out the box and label first
         self.play(
@@ -176,10 +201,11 @@ class AdLinkingVisualization(Scene):
         self.node_labels1 = node_labels
         self.wait(0.5)
     
+    @step
     def connect_nodes_in_graph(self):
         # Ensure the previous text is fully faded out before the new one appears
         # Make text over 2 lines
-        step3_text = Text("Next, we can create a graph representation where data \nis linked together when seen in the same ad.").scale(0.8).to_edge(UP)
+        step3_text = label("Next, we can create a graph representation where data \nis linked together when seen in the same ad.").scale(0.8).to_edge(UP)
         self.play(
             FadeOut(self.step2_text, run_time=0.5),
         )
@@ -202,11 +228,7 @@ class AdLinkingVisualization(Scene):
         # Create edges from center (title) to all other nodes
         edges = []
         for i in range(1, len(self.ad1_elements)):
-            edge = Line(
-                title_node.get_center(),
-                self.ad1_elements[i].get_center(),
-                color=WHITE
-            )
+            edge = self.connect(title_node, self.ad1_elements[i], color=WHITE)
             edges.append(edge)
         
         # FIX 5: Show all edges simultaneously
@@ -218,9 +240,10 @@ class AdLinkingVisualization(Scene):
         
         self.wait(0.5)
     
+    @step
     def create_second_ad(self):
         # Ensure the previous text is fully faded out before the new one appears
-        step4_text = Text("Now, let's look at what happens \nwhen we have multiple ads.").scale(0.8).to_edge(UP)
+        step4_text = label("Now, let's look at what happens \nwhen we have multiple ads.").scale(0.8).to_edge(UP)
         self.play(
             FadeOut(self.step3_text, run_time=0.5),
         )
@@ -235,26 +258,10 @@ class AdLinkingVisualization(Scene):
             run_time=1.5
         )
         
-        # Create second ad elements (reusing code with modifications)
-        ad2_box = Rectangle(height=4, width=5, color=WHITE)
-        ad2_label = Text("Ad 2", color=WHITE).next_to(ad2_box, UP)
-        
-        ad2_box.shift(RIGHT * 3)
-        ad2_label.shift(RIGHT * 3)
-        
-        # Second ad content with one matching element (phone number)
-        ad2_title = Text("Escort Ad 2", color=WHITE, font_size=24)
-        ad2_text = Text("Example Ad Text", color=WHITE, font_size=20)
-        ad2_phone = Text("XXX-XXX-XXXX", color=WHITE, font_size=20)  # Same phone number
-        
-        # Image placeholder with person icon
-        ad2_img1 = self.create_person_icon(1, 1.5, WHITE)
-        
-        # Position elements properly inside the box
-        ad2_title.move_to(ad2_box.get_center() + UP * 1)
-        ad2_text.move_to(ad2_box.get_center() + UP * 0.3)
-        ad2_phone.move_to(ad2_box.get_center() + DOWN * 0.4)
-        ad2_img1.move_to(ad2_box.get_center() + DOWN * 1.2)
+        # Create second ad, with at least one element matching the first ad
+        ad2 = AdCard(self.record2, header="Ad 2").shift(RIGHT * 3)
+        ad2_box = ad2.box
+        ad2_label = ad2.header
         
         # Show ad2 box and label
         self.play(
@@ -264,45 +271,22 @@ class AdLinkingVisualization(Scene):
         
         # Show ad2 content
         self.play(
-            Write(ad2_title),
-            Write(ad2_text),
-            Write(ad2_phone),
-            Create(ad2_img1),
+            Write(ad2.title),
+            Write(ad2.text),
+            Write(ad2.phone),
+            *[Create(img) for img in ad2.images],
             run_time=2
         )
         
-        self.ad2_elements = [ad2_title, ad2_text, ad2_phone, ad2_img1]
+        self.ad2_elements = ad2.elements
         self.ad2_box = ad2_box
         self.ad2_label = ad2_label
         
-        # Define node positions for second graph
+        # Create nodes for the second graph around the second ad's center
         center2 = ad2_box.get_center()
-        radius = 1.5
-        angles = np.linspace(0, 2 * np.pi, len(self.ad2_elements), endpoint=False)
-        positions = [center2 + radius * np.array([np.cos(angle), np.sin(angle), 0]) for angle in angles]
-        
-        # Create nodes
-        nodes2 = []
-        node_labels2 = []
-        
-        for i in range(len(self.ad2_elements)):
-            if i == 0:  # Title node
-                node = Circle(radius=0.4, color=self.text_node_color, fill_opacity=0.7)
-                label = Text("Title", font_size=16)
-            elif i == 1:  # Description
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text("Text", font_size=16)
-            elif i == 2:  # Phone (matching node)
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text("Phone", font_size=16)
-            else:  # Images
-                node = Circle(radius=0.4, color=self.node_color, fill_opacity=0.7)
-                label = Text(f"Img{i-2}", font_size=16)
-            
-            node.move_to(positions[i])
-            label.move_to(node.get_center())
-            nodes2.append(node)
-            node_labels2.append(label)
+        attribute_nodes2 = self.create_attribute_nodes(len(self.ad2_elements), center2)
+        nodes2 = [n.circle for n in attribute_nodes2]
+        node_labels2 = [n.text_label for n in attribute_nodes2]
         
         # First fade out the box and label for a cleaner transition
         self.play(
@@ -332,11 +316,7 @@ class AdLinkingVisualization(Scene):
         # Create edges for graph 2
         edges2 = []
         for i in range(1, len(self.ad2_elements)):
-            edge = Line(
-                title_node2.get_center(),
-                self.ad2_elements[i].get_center(),
-                color=WHITE
-            )
+            edge = self.connect(title_node2, self.ad2_elements[i], color=WHITE)
             edges2.append(edge)
         
         # FIX 5: Show all edges simultaneously
@@ -351,9 +331,11 @@ class AdLinkingVisualization(Scene):
         
         self.wait(0.5)
     
+    @step
     def highlight_matching_nodes(self):
         # Ensure the previous text is fully faded out before the new one appears
-        step5_text = Text("These two ads have the same phone number.").scale(0.8).to_edge(UP)
+        match_name = {"phone": "phone number", "image": "image", "text": "ad text"}[self.match_kind]
+        step5_text = label(f"These two ads have the same {match_name}.").scale(0.8).to_edge(UP)
         self.play(
             FadeOut(self.step4_text, run_time=0.5),
         )
@@ -362,9 +344,9 @@ class AdLinkingVisualization(Scene):
         )
         self.step5_text = step5_text
         
-        # Identify the matching nodes (phone numbers)
-        phone_node1 = self.ad1_elements[2]
-        phone_node2 = self.ad2_elements[2]
+        # Identify the matching nodes found by the linkage engine
+        phone_node1 = self.ad1_elements[self.match_index1]
+        phone_node2 = self.ad2_elements[self.match_index2]
         
         # Highlight matching nodes with a pulse animation
         self.play(
@@ -374,7 +356,7 @@ class AdLinkingVisualization(Scene):
         )
         
         # Add equals sign between the nodes with a fade in
-        equals_sign = Text("=", font_size=36, color=self.highlight_color)
+        equals_sign = label("=", font_size=36, color=self.highlight_color)
         equals_sign.move_to((phone_node1.get_center() + phone_node2.get_center()) / 2)
         
         self.play(FadeIn(equals_sign))
@@ -382,9 +364,10 @@ class AdLinkingVisualization(Scene):
         
         self.wait(0.5)
     
+    @step
     def merge_graphs(self):
         # FIX 3: Position the step6_text to avoid overlap with final label
-        step6_text = Text("This allows us to connect these two ads \ntogether into a single graph.").scale(0.8).to_edge(UP)
+        step6_text = label("This allows us to connect these two ads \ntogether into a single graph.").scale(0.8).to_edge(UP)
         self.play(
             FadeOut(self.step5_text, run_time=0.5),
         )
@@ -394,34 +377,23 @@ class AdLinkingVisualization(Scene):
         self.step6_text = step6_text
         
         # Get positions
-        phone_node1 = self.ad1_elements[2]
-        phone_node2 = self.ad2_elements[2]
-        phone_label1 = self.node_labels1[2]
-        phone_label2 = self.node_labels2[2]
-        
-        # Find the title nodes and edges (needed for the line update)
-        title_node1 = self.ad1_elements[0]
-        title_node2 = self.ad2_elements[0]
-        
-        # Find edges connected to phone nodes
-        phone_edges1 = []
-        phone_edges2 = []
+        phone_node1 = self.ad1_elements[self.match_index1]
+        phone_node2 = self.ad2_elements[self.match_index2]
+        phone_label1 = self.node_labels1[self.match_index1]
+        phone_label2 = self.node_labels2[self.match_index2]
         
-        for edge in self.edges1:
-            if np.allclose(edge.get_end(), phone_node1.get_center(), atol=0.1):
-                phone_edges1.append(edge)
-                
-        for edge in self.edges2:
-            if np.allclose(edge.get_end(), phone_node2.get_center(), atol=0.1):
-                phone_edges2.append(edge)
+        # Look up edges connected to the matching nodes in the adjacency index
+        phone_edges1 = list(self.incident_edges.get(phone_node1, []))
+        phone_edges2 = list(self.incident_edges.get(phone_node2, []))
         
         # Target position for merged node (midway)
         merged_pos = (phone_node1.get_center() + phone_node2.get_center()) / 2
         
         # Create merged node
-        merged_node = Circle(radius=0.5, color=self.highlight_color, fill_opacity=0.9)
-        merged_node.move_to(merged_pos)
-        merged_label = Text("Phone", font_size=16).move_to(merged_pos)
+        merged = AttributeNode.create(self.node_label_text(self.match_index1), self.highlight_color,
+                                      radius=0.5, fill_opacity=0.9, at=merged_pos)
+        merged_node = merged.circle
+        merged_label = merged.text_label
         
         # First fade out equals sign
         self.play(
@@ -429,28 +401,22 @@ class AdLinkingVisualization(Scene):
             run_time=0.5
         )
         
-        # FIX 4: Create Always updaters for the edges BEFORE starting the merge animation
-        # This makes the lines follow the nodes as they move
-        for edge in phone_edges1:
-            edge.add_updater(lambda e, tn=title_node1, pn=phone_node1: 
-                             e.put_start_and_end_on(tn.get_center(), pn.get_center()))
-        
-        for edge in phone_edges2:
-            edge.add_updater(lambda e, tn=title_node2, pn=phone_node2: 
-                             e.put_start_and_end_on(tn.get_center(), pn.get_center()))
+        # Merge the phone nodes; the edges follow them while the merge plays
+        with self.following_edges(phone_edges1 + phone_edges2, moving=[phone_node1, phone_node2]):
+            self.play(
+                Transform(phone_node1, merged_node),
+                Transform(phone_node2, merged_node.copy()),
+                Transform(phone_label1, merged_label),
+                Transform(phone_label2, merged_label.copy()),
+                run_time=1.5
+            )
         
-        # Merge the phone nodes - the edges will follow due to the updaters
-        self.play(
-            Transform(phone_node1, merged_node),
-            Transform(phone_node2, merged_node.copy()),
-            Transform(phone_label1, merged_label),
-            Transform(phone_label2, merged_label.copy()),
-            run_time=1.5
-        )
+        # Both matching nodes now sit on the merged node; keep the index on one of them
+        self.redirect_edges(phone_node2, phone_node1)
         
-        # Remove the updaters after the animation completes
-        for edge in phone_edges1 + phone_edges2:
-            edge.clear_updaters()
+        # Spread the merged component out so nodes from both ads don't overlap
+        self.relayout_merged_graph(phone_node2, phone_node1)
+        merged_label.move_to(phone_node1.get_center())
         
         # Create box around the merged graph
         merged_graph_elements = VGroup(
@@ -477,14 +443,19 @@ class AdLinkingVisualization(Scene):
         )
         
         # Final message
-        final_text = Text("Our new connected component is linkable to a potential individual.", 
+        final_text = label("Our new connected component is linkable to a potential individual.", 
                          color=WHITE, font_size=28).to_edge(DOWN, buff=0.5)
         self.play(Write(final_text))
         
         self.wait(2)
 
 
-# To render this animation:
+# To render this animation, optionally from a crawl export (JSONL, CSV, .gz):
+#   python ad_linkage.py [crawl.jsonl] [component size]
 if __name__ == "__main__":
-    scene = AdLinkingVisualization()
+    import sys
+    ads = None
+    if len(sys.argv) > 1:
+        ads = first_component_ads(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 50)
+    scene = AdLinkingVisualization(ads=ads)
     scene.render()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import csv
+import gzip
+import itertools
+import json
+import random
+import re
+
+from linkage import AdRecord, LinkageEngine, UnionFind
+
+NON_DIGITS = re.compile(r"\D")
+HEX = re.compile(r"[0-9a-f]+")
+HASH_SEPARATORS = re.compile(r"[\s:-]")
+# Ads first_component_ads reads by default; its state grows with the
+# distinct phones and images in that window
+DEFAULT_WINDOW = 1_000_000
+
+
+def open_text(path):
+    # Crawl exports are often gzipped; both are read line by line
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def normalize_phone(raw):
+    # "(205) 555-0134", "+1 205.555.0134" and "2055550134" all become
+    # "205-555-0134"; anything too short to be a phone number is dropped
+    digits = NON_DIGITS.sub("", raw or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+    return digits if len(digits) >= 7 else ""
+
+
+def normalize_image_hash(raw):
+    # Hex hashes become lowercase hex without prefix, separators or
+    # whitespace. Other ids (URLs, file names) are only trimmed and
+    # lowercased, so distinct ones never collapse into the same string.
+    value = (raw or "").strip().lower()
+    digits = HASH_SEPARATORS.sub("", value[2:] if value.startswith("0x") else value)
+    return digits if HEX.fullmatch(digits) else value
+
+
+def normalize_record(data):
+    record = AdRecord.from_dict(data)
+    images = tuple(h for h in (normalize_image_hash(h) for h in record.image_hashes) if h)
+    # JSON null fields come through as None
+    return record._replace(
+        title=(record.title or "").strip(),
+        text=" ".join((record.text or "").split()),
+        phone=normalize_phone(str(record.phone or "")),
+        image_hashes=images,
+        state=(record.state or "").strip().upper(),
+    )
+
+
+def read_rows(path, fmt=None):
+    # Raw dicts from a JSONL or CSV export, one at a time; malformed JSON lines
+    # are skipped rather than aborting a multi-GB read
+    fmt = fmt or ("csv" if ".csv" in str(path) else "jsonl")
+    with open_text(path) as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def stream_ads(path, fmt=None):
+    # Normalized AdRecords streamed from a crawl export
+    for row in read_rows(path, fmt):
+        yield normalize_record(row)
+
+
+def window(ads, start=0, size=None):
+    return itertools.islice(ads, start, None if size is None else start + size)
+
+
+def sample(ads, k, seed=0):
+    # Reservoir sample of k ads from a stream of unknown length, in stream order
+    rng = random.Random(seed)
+    reservoir = []
+    for i, ad in enumerate(ads):
+        if i < k:
+            reservoir.append((i, ad))
+        else:
+            j = rng.randrange(i + 1)
+            if j < k:
+                reservoir[j] = (i, ad)
+    return [ad for _, ad in sorted(reservoir, key=lambda item: item[0])]
+
+
+def first_component_reaching(ads, size):
+    # Link the stream one ad at a time, the way LinkageEngine does, and stop
+    # as soon as some component holds `size` ads. Ads get no node of their
+    # own: each one unions its phone and images and is counted at their root,
+    # so memory grows with distinct attributes, not with ads. Returns
+    # (stream position of the ad that completed it, member(position, ad)) for
+    # picking the component's ads out of a second pass, or None if the stream
+    # ends first.
+    keys = LinkageEngine().attribute_keys
+    uf = UnionFind()
+    nodes = {}
+    ads_at = []
+    for position, ad in enumerate(ads):
+        attrs = []
+        for key in keys(ad):
+            node = nodes.get(key)
+            if node is None:
+                node = nodes[key] = uf.add()
+                ads_at.append(0)
+            attrs.append(node)
+        if not attrs:
+            # An ad without phone or image is a component of one
+            if size <= 1:
+                return position, lambda i, ad, last=position: i == last
+            continue
+        root = uf.find(attrs[0])
+        for attr in attrs[1:]:
+            root, absorbed = uf.union(root, attr)
+            if absorbed is not None:
+                ads_at[root] += ads_at[absorbed]
+        ads_at[root] += 1
+        if ads_at[root] >= size:
+            def member(i, ad, root=root):
+                first = next(iter(keys(ad)), None)
+                return first is not None and uf.find(nodes[first]) == root
+            return position, member
+    return None
+
+
+def collect_component(ads, last, member):
+    # Second pass over the same stream picking out the component's ads,
+    # stopping after the ad that completed it
+    return [ad for i, ad in enumerate(itertools.islice(ads, last + 1)) if member(i, ad)]
+
+
+def first_component_ads(path, size, fmt=None, start=0, limit=DEFAULT_WINDOW, near_duplicates=False):
+    # Records of the first component in a crawl export that reaches `size`
+    # ads, searched among the limit ads after start (None reads the whole
+    # file). The scan keeps one id and one count per distinct phone or image
+    # and no records; the component's records are re-read afterwards.
+    # With near_duplicates, an extra first pass indexes the perceptual image
+    # hashes so ads sharing resized or recompressed copies of a photo link too.
+    mapping = None
+    if near_duplicates:
+        from image_index import merge_near_duplicates, near_duplicate_map
+
+        mapping = near_duplicate_map(window(stream_ads(path, fmt), start, limit))
+
+    def ads():
+        stream = window(stream_ads(path, fmt), start, limit)
+        return stream if mapping is None else merge_near_duplicates(stream, mapping)
+
+    found = first_component_reaching(ads(), size)
+    if found is None:
+        return []
+    return collect_component(ads(), *found)
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+
+import numpy as np
+from manim import DEFAULT_QUALITY, DL, DR, QUALITIES, UL, UR, ImageMobject, config
+from PIL import Image
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+# ImageMobject's default scale_to_resolution: an image this many pixels tall
+# fills the frame height whatever resolution the scene renders at
+REFERENCE_HEIGHT = QUALITIES[DEFAULT_QUALITY]["pixel_height"]
+
+
+def resolve_asset(name):
+    # Paths relative to the working directory first, then bare names under img/
+    if os.path.exists(name):
+        return os.path.abspath(name)
+    candidate = os.path.join(IMG_DIR, name)
+    if os.path.exists(candidate):
+        return candidate
+    raise FileNotFoundError(name)
+
+
+class Asset:
+    # One image file: bytes are read once per process and decoded variants are
+    # cached per size, in memory and under media/asset_cache keyed on the file
+    # hash, so later renders load a small array instead of decoding the file
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.digest = hashlib.sha1(self.data).hexdigest()
+        # Opening only parses the header; nothing is decoded here
+        with Image.open(io.BytesIO(self.data)) as image:
+            self.width, self.height = image.size
+        self.variants = {}
+
+    def __deepcopy__(self, memo):
+        # Mobject.copy deep-copies; copies of an image keep sharing its asset
+        return self
+
+    def variant_shape(self, factor):
+        factor = min(factor, 1.0)
+        return max(1, round(self.height * factor)), max(1, round(self.width * factor))
+
+    def pixels(self, shape):
+        pixels = self.variants.get(shape)
+        if pixels is not None:
+            return pixels
+        cache_path = os.path.join(config.media_dir, "asset_cache", f"{self.digest}_{shape[0]}x{shape[1]}.npy")
+        if os.path.exists(cache_path):
+            pixels = np.load(cache_path)
+        else:
+            with Image.open(io.BytesIO(self.data)) as image:
+                image = image.convert("RGBA")
+                if shape != (self.height, self.width):
+                    image = image.resize((shape[1], shape[0]), Image.LANCZOS)
+                pixels = np.array(image)
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Parallel renders share the cache; rename so no process loads a
+            # partly written array
+            tmp_path = f"{os.path.splitext(cache_path)[0]}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, pixels)
+            os.replace(tmp_path, cache_path)
+        self.variants[shape] = pixels
+        return pixels
+
+
+# Shared by every scene rendered in this process
+ASSETS = {}
+
+
+def get_asset(name):
+    path = resolve_asset(name)
+    asset = ASSETS.get(path)
+    if asset is None:
+        asset = ASSETS[path] = Asset(path)
+    return asset
+
+
+class AssetImageMobject(ImageMobject):
+    # ImageMobject sized from the asset's header whose pixels are decoded (or
+    # loaded from the variant cache) the first time anything reads them,
+    # normally the first frame it is displayed in
+    def __init__(self, asset, shape, **kwargs):
+        self.asset = asset
+        self.variant_shape = shape
+        self._pixels = None
+        # Keep the on-screen size of the full-resolution image
+        kwargs.setdefault("scale_to_resolution", REFERENCE_HEIGHT * shape[0] / asset.height)
+        super().__init__(np.zeros((1, 1, 4), dtype=np.uint8), **kwargs)
+        # Drop the placeholder ImageMobject was built with, and the alpha
+        # newer versions record from it
+        self._pixels = None
+        self._orig_alpha = None
+
+    @property
+    def pixel_array(self):
+        if self._pixels is None:
+            # Copied because set_opacity and set_color write into the array
+            self._pixels = self.asset.pixels(self.variant_shape).copy()
+        return self._pixels
+
+    @pixel_array.setter
+    def pixel_array(self, value):
+        self._pixels = value
+
+    @property
+    def orig_alpha_pixel_array(self):
+        # Newer ImageMobject versions scale this per-pixel alpha in
+        # set_opacity; it must come from the decoded image, not the 1x1
+        # placeholder, or the image turns fully transparent
+        if self._orig_alpha is None:
+            self._orig_alpha = self.asset.pixels(self.variant_shape)[:, :, 3].copy()
+        return self._orig_alpha
+
+    @orig_alpha_pixel_array.setter
+    def orig_alpha_pixel_array(self, value):
+        self._orig_alpha = value
+
+    def reset_points(self):
+        # Same as AbstractImageMobject.reset_points, using the variant's shape
+        # so sizing the image doesn't decode it
+        self.points = np.array([UL, UR, DL, DR])
+        self.center()
+        h, w = self.variant_shape
+        height = h / self.scale_to_resolution * config["frame_height"]
+        self.stretch_to_fit_height(height)
+        self.stretch_to_fit_width(height * w / h)
+
+
+def image_asset(name, scale=1.0, **kwargs):
+    # Drop-in for ImageMobject(name).scale(scale). Pixels are downscaled to what
+    # the current render resolution can show at that scale, so -ql previews
+    # never hold full-size screenshots.
+    asset = get_asset(name)
+    factor = scale * config.pixel_height / REFERENCE_HEIGHT
+    image = AssetImageMobject(asset, asset.variant_shape(factor), **kwargs)
+    if scale != 1:
+        image.scale(scale)
+    return image
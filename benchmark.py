@@ -0,0 +1,207 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Lower is better for every metric compared between runs
+COMPARED_METRICS = ("construct_s", "render_s", "per_play_ms", "peak_rss_mb")
+
+# Low resolution keeps a full sweep inside a few minutes
+BASE_CONFIG = {"pixel_height": 270, "pixel_width": 480, "frame_rate": 15, "disable_caching": True}
+
+
+def synthetic_ads(n, seed=0):
+    # Crawl-like ad records: phone numbers and images are drawn from pools
+    # smaller than n so ads link into components of varying size
+    from linkage import AdRecord
+
+    rng = random.Random(seed)
+    phones = max(n // 3, 1)
+    images = max(n // 2, 1)
+    return [
+        AdRecord(
+            f"Escort Ad {i + 1}",
+            "Example Ad Text",
+            f"555-{rng.randrange(phones):07d}",
+            tuple(f"img-{rng.randrange(images)}" for _ in range(rng.randint(1, 3))),
+        )
+        for i in range(n)
+    ]
+
+
+def benchmark_cases(quick=False):
+    # (name, scene module, scene class, scene kwargs, extra manim config)
+    ad_counts = [2, 1000] if quick else [2, 1000, 10000, 100000]
+    cluster_counts = [8, 200] if quick else [8, 200, 1000, 5000]
+    map_heights = [270] if quick else [270, 540, 1080]
+    cases = []
+    # The linkage scene always draws the two ads of one linking pair, so this
+    # sweep measures linking n input ads (construct_s), not rendering scale
+    for n in ad_counts:
+        cases.append((f"ad_linkage[linked_input_ads={n}]", "ad_linkage", "AdLinkingVisualization",
+                       {"ads": ("synthetic", n)}, {}))
+    for n in cluster_counts:
+        cases.append((f"giant_component[clusters={n}]", "giant_component", "GiantComponentScene",
+                      {"num_clusters": n, "nodes_per_cluster": 6, "seed": 0}, {}))
+    # Frame time of the one-mobject-per-node mode at full HD, drawn through
+    # the level-of-detail camera and through manim's stock camera
+    if not quick:
+        for camera in ("lod", "stock"):
+            cases.append((f"giant_component[clusters=40,height=1080,camera={camera}]", "giant_component",
+                          "GiantComponentScene", {"num_clusters": 40, "nodes_per_cluster": 6, "seed": 0,
+                                                  "stock_camera": camera == "stock"},
+                          {"pixel_height": 1080, "pixel_width": 1920}))
+    for h in map_heights:
+        cases.append((f"us_map[height={h}]", "us_map_scene", "HighlightMapScene", {},
+                      {"pixel_height": h, "pixel_width": h * 16 // 9}))
+    return cases
+
+
+def build_scene(module_name, class_name, scene_kwargs):
+    module = __import__(module_name)
+    scene_kwargs = dict(scene_kwargs)
+    if isinstance(scene_kwargs.get("ads"), tuple):
+        scene_kwargs["ads"] = synthetic_ads(scene_kwargs["ads"][1])
+    if scene_kwargs.pop("stock_camera", False):
+        from manim import MovingCamera
+
+        scene_kwargs["camera_class"] = MovingCamera
+    return getattr(module, class_name)(**scene_kwargs)
+
+
+def run_case(module_name, class_name, scene_kwargs, extra_config):
+    # Runs in a fresh process so peak RSS belongs to this case alone
+    from manim import tempconfig
+
+    from render_driver import hold_static_frames
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as media_dir:
+        # Construction: build the scene and run construct without rendering frames
+        with tempconfig({**BASE_CONFIG, **extra_config, "media_dir": media_dir,
+                         "dry_run": True, "skip_animations": True}):
+            start = time.perf_counter()
+            scene = build_scene(module_name, class_name, scene_kwargs)
+            scene.render()
+            construct_s = time.perf_counter() - start
+
+        # Full render at low resolution, timing every play (waits included)
+        random.seed(0)
+        with tempconfig({**BASE_CONFIG, **extra_config, "media_dir": media_dir, "write_to_movie": True}):
+            scene = hold_static_frames(build_scene(module_name, class_name, scene_kwargs))
+            play = scene.play
+            play_times = []
+
+            def timed_play(*args, **kwargs):
+                t = time.perf_counter()
+                result = play(*args, **kwargs)
+                play_times.append(time.perf_counter() - t)
+                return result
+
+            scene.play = timed_play
+            start = time.perf_counter()
+            scene.render()
+            render_s = time.perf_counter() - start
+            frames = int(round(scene.renderer.time * scene.camera.frame_rate))
+
+    return {
+        "construct_s": construct_s,
+        "render_s": render_s,
+        "frames": frames,
+        "fps": frames / render_s if render_s else 0.0,
+        "plays": len(play_times),
+        "per_play_ms": 1000 * sum(play_times) / max(len(play_times), 1),
+        "max_play_ms": 1000 * max(play_times, default=0.0),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(cases, output):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name, module_name, class_name, scene_kwargs, extra_config in cases:
+        with ctx.Pool(1) as pool:
+            metrics = pool.apply(run_case, (module_name, class_name, scene_kwargs, extra_config))
+        params = {k: v[1] if k == "ads" else v for k, v in scene_kwargs.items()}
+        results.append({"name": name, "params": {**params, **extra_config}, **metrics})
+        print(f"{name:36s} construct {metrics['construct_s']:7.2f}s  render {metrics['render_s']:7.2f}s  "
+              f"{metrics['fps']:6.1f} fps  {metrics['per_play_ms']:8.1f} ms/play  {metrics['peak_rss_mb']:7.0f} MB")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": BASE_CONFIG,
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare(baseline, current, threshold=0.1):
+    # Returns (case, metric, old, new, relative change) for every metric that
+    # got worse by more than threshold
+    old = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = old.get(result["name"])
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            a, b = before.get(metric), result.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            if change > threshold:
+                regressions.append((result["name"], metric, a, b, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark construction and rendering of the explainer scenes")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmark sweep and write JSON results")
+    run.add_argument("-o", "--output", default="benchmark_results.json")
+    run.add_argument("--quick", action="store_true", help="smallest sizes only")
+    run.add_argument("-k", "--filter", default="", help="only run cases whose name contains this")
+
+    cmp = sub.add_parser("compare", help="compare two result files and fail on regressions")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown, e.g. 0.1 for 10%%")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        sys.path.insert(0, os.getcwd())
+        cases = [c for c in benchmark_cases(args.quick) if args.filter in c[0]]
+        run_benchmarks(cases, args.output)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for name, metric, a, b, change in regressions:
+            print(f"REGRESSION {name} {metric}: {a:.3f} -> {b:.3f} (+{change:.0%})")
+        if not regressions:
+            print(f"No regressions above {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
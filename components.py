@@ -0,0 +1,182 @@
+from collections import OrderedDict
+
+from manim import *
+import numpy as np
+
+from labels import label
+
+
+def ring_positions(center, count, radius=1.5):
+    # Evenly spaced points on a circle around center, shape (count, 3)
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    offsets = np.stack([np.cos(angles), np.sin(angles), np.zeros(count)], axis=1)
+    return np.asarray(center, dtype=float) + radius * offsets
+
+
+class Prototyped:
+    # Mixin for mobjects that are built once per distinct set of construction
+    # arguments and stamped out with copy() afterwards. Like the label cache,
+    # least recently used prototypes are evicted past max_prototypes.
+    prototypes = OrderedDict()
+    max_prototypes = 256
+
+    @classmethod
+    def create(cls, *args, at=None, **kwargs):
+        key = (cls, tuple(str(a) for a in args), tuple((k, str(v)) for k, v in sorted(kwargs.items())))
+        prototypes = Prototyped.prototypes
+        prototype = prototypes.get(key)
+        if prototype is None:
+            prototype = cls(*args, **kwargs)
+            prototypes[key] = prototype
+            if len(prototypes) > Prototyped.max_prototypes:
+                prototypes.popitem(last=False)
+        else:
+            prototypes.move_to_end(key)
+        mob = prototype.copy()
+        if at is not None:
+            mob.move_to(at)
+        return mob
+
+
+class PersonIcon(Prototyped, VGroup):
+    # Placeholder for an ad image: a framed head-and-shoulders icon with a caption
+    def __init__(self, height=1, width=1.5, color=WHITE, **kwargs):
+        super().__init__(**kwargs)
+        # Create visible border box for the person icon
+        self.border = Rectangle(height=height, width=width, color=color)
+
+        # Calculate proportions
+        head_radius = height * 0.2
+        body_width = width * 0.6
+
+        # Head (circle)
+        self.head = Circle(radius=head_radius, color=color, fill_opacity=1)
+        self.head.move_to(self.border.get_top() + DOWN * head_radius * 1.5)
+
+        # Body is a half-circle (angle PI) just below the head
+        self.body = Arc(radius=body_width/3, angle=PI, color=color, fill_opacity=1)
+        self.body.move_to(self.head.get_bottom() + DOWN * 0.05)
+
+        # Create "Image" text label
+        self.caption = label("Image", font_size=18, color=color)
+        self.caption.next_to(self.border, DOWN, buff=0.1)
+
+        self.add(self.border, self.head, self.body, self.caption)
+
+
+class AttributeNode(Prototyped, VGroup):
+    # A graph node for one ad attribute: a filled circle with its label on top
+    def __init__(self, text, color, radius=0.4, fill_opacity=0.7, font_size=16, **kwargs):
+        super().__init__(**kwargs)
+        self.circle = Circle(radius=radius, color=color, fill_opacity=fill_opacity)
+        self.text_label = label(text, font_size=font_size).move_to(self.circle.get_center())
+        self.add(self.circle, self.text_label)
+
+    @classmethod
+    def batch(cls, texts, colors, positions, **kwargs):
+        return [cls.create(text, color, at=pos, **kwargs) for text, color, pos in zip(texts, colors, positions)]
+
+
+class AdCard(VGroup):
+    # A scraped ad drawn as a box holding its title, text, phone and one
+    # PersonIcon per image, with an optional header above the box
+    def __init__(self, record, header=None, height=4, width=5, color=WHITE, **kwargs):
+        super().__init__(**kwargs)
+        self.box = Rectangle(height=height, width=width, color=color)
+        self.header = label(header, color=color).next_to(self.box, UP) if header else None
+
+        self.title = label(record.title, color=color, font_size=24)
+        self.text = label(record.text, color=color, font_size=20)
+        self.phone = label(record.phone, color=color, font_size=20)
+        self.images = [PersonIcon.create(1, 1.5, color) for _ in record.image_hashes]
+
+        # Stack the fields under the top of the box, images side by side below
+        self.title.next_to(self.box.get_top(), DOWN, buff=0.3)
+        self.text.next_to(self.title, DOWN, buff=0.2)
+        self.phone.next_to(self.text, DOWN, buff=0.2)
+        if self.images:
+            VGroup(*self.images).arrange(RIGHT, buff=0.5).next_to(self.phone, DOWN, buff=0.2)
+        VGroup(*self.elements).move_to(self.box.get_center())
+
+        self.add(self.box, *([self.header] if self.header else []), *self.elements)
+
+    @property
+    def elements(self):
+        # Title, text, phone, then images: the order nodes are created in
+        return [self.title, self.text, self.phone, *self.images]
+
+    @classmethod
+    def batch(cls, records, columns=None, buff=0.5, headers=True, **kwargs):
+        # Build and lay out many cards in a grid in one call
+        cards = [cls(record, header=f"Ad {i + 1}" if headers else None, **kwargs) for i, record in enumerate(records)]
+        if not cards:
+            return VGroup()
+        columns = columns or int(np.ceil(np.sqrt(len(cards))))
+        cell = np.array([cards[0].width + buff, cards[0].height + buff])
+        index = np.arange(len(cards))
+        grid = np.stack([index % columns, -(index // columns)], axis=1) * cell
+        grid -= (grid.max(axis=0) + grid.min(axis=0)) / 2
+        for card, (x, y) in zip(cards, grid):
+            card.move_to(np.array([x, y, 0]))
+        return VGroup(*cards)
+
+
+class EdgeFollower:
+    # Keeps straight edges attached to their nodes while the nodes move, with
+    # one updater for the whole graph instead of one per edge. While attached,
+    # every edge's points are a view into one (edges, 4, 3) buffer that each
+    # frame rewrites in a single NumPy operation. Only the nodes in moving are
+    # re-read per frame (all of them by default), so merging a hub touches one
+    # node however many edges it has. Use it as a context manager around the
+    # plays that move the nodes; updaters are attached and removed with it.
+    THIRDS = np.array([0, 1 / 3, 2 / 3, 1])
+
+    def __init__(self, scene, edges, ends, moving=None):
+        self.scene = scene
+        self.edges = list(edges)
+        self.nodes = []
+        index = {}
+        pairs = []
+        for start_node, end_node in ends:
+            for node in (start_node, end_node):
+                if node not in index:
+                    index[node] = len(self.nodes)
+                    self.nodes.append(node)
+            pairs.append((index[start_node], index[end_node]))
+        self.pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+        self.moving = self.nodes if moving is None else [n for n in moving if n in index]
+        self.moving_rows = np.array([index[n] for n in self.moving], dtype=int)
+        self.centers = np.array([n.get_center() for n in self.nodes]).reshape(-1, 3)
+        self.buffer = None
+        self.host = Mobject()
+
+    def update(self, mob):
+        if len(self.moving):
+            self.centers[self.moving_rows] = [n.get_center() for n in self.moving]
+        starts = self.centers[self.pairs[:, 0]]
+        delta = self.centers[self.pairs[:, 1]] - starts
+        self.buffer[:] = starts[:, None] + self.THIRDS[None, :, None] * delta[:, None]
+
+    def __enter__(self):
+        self.buffer = np.empty((len(self.edges), 4, 3))
+        for edge, view in zip(self.edges, self.buffer):
+            edge.points = view
+        self.update(self.host)
+        # The updater's host goes right before the first edge in the scene, so
+        # the edges count as moving and are redrawn every frame
+        edges = set(self.edges)
+        mobjects = self.scene.mobjects
+        position = next((i for i, mob in enumerate(mobjects) if edges.intersection(mob.get_family())), len(mobjects))
+        mobjects.insert(position, self.host)
+        self.host.add_updater(self.update)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.host.remove_updater(self.update)
+        self.scene.remove(self.host)
+        self.update(self.host)
+        # Give every edge its own points again
+        for edge in self.edges:
+            edge.points = edge.points.copy()
+        self.buffer = None
+        return False
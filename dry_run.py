@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from render_driver import seed_everything
+
+
+def text_types():
+    from manim import MarkupText, SingleStringMathTex, Text
+
+    return Text, MarkupText, SingleStringMathTex
+
+
+def text_of(mob):
+    text = getattr(mob, "original_text", None) or getattr(mob, "tex_string", None) or type(mob).__name__
+    return " ".join(text.split())
+
+
+def visible(mob):
+    from manim import VMobject
+
+    if isinstance(mob, VMobject):
+        return mob.get_fill_opacity() > 0 or (mob.get_stroke_opacity() > 0 and mob.get_stroke_width() > 0)
+    return True
+
+
+def box(points):
+    return np.r_[points[:, :2].min(axis=0), points[:, :2].max(axis=0)]
+
+
+def layout_boxes(mobjects):
+    # (kind, description, box) for every visible piece of the scene: whole
+    # text mobjects (their glyphs are not descended into) and every other
+    # mobject with points. Boxes are (xmin, ymin, xmax, ymax).
+    texts = text_types()
+    found = []
+    for index, top in enumerate(mobjects):
+        stack = [top]
+        while stack:
+            mob = stack.pop()
+            if isinstance(mob, texts):
+                points = mob.get_all_points()
+                if len(points) and visible(mob.family_members_with_points()[0]):
+                    found.append(("text", text_of(mob), box(points)))
+                continue
+            if len(mob.points) and visible(mob):
+                found.append(("graph", f"{type(mob).__name__} in {type(top).__name__}#{index}", box(mob.points)))
+            stack.extend(mob.submobjects)
+    return found
+
+
+def find_overlaps(mobjects, min_overlap=0.02):
+    # Text overlapping graph elements or other text, plus text leaving the
+    # frame. Graph elements whose box holds the whole text box (backgrounds,
+    # frames, the map around a caption placed on it) don't count; text on top
+    # of text always does. Returns (kind, text, other, overlap width, overlap
+    # height) tuples.
+    from manim import config
+
+    pieces = layout_boxes(mobjects)
+    kinds = np.array([kind for kind, _, _ in pieces])
+    texts = np.flatnonzero(kinds == "text")
+    if not len(texts):
+        return []
+    names = [name for _, name, _ in pieces]
+    boxes = np.array([b for _, _, b in pieces])
+    graph = kinds == "graph"
+    half_w, half_h = config.frame_width / 2, config.frame_height / 2
+    overlaps = []
+    for i in texts:
+        b = boxes[i]
+        if b[0] < -half_w or b[1] < -half_h or b[2] > half_w or b[3] > half_h:
+            overlaps.append(("offscreen", names[i], "frame", 0.0, 0.0))
+        w = np.minimum(boxes[:, 2], b[2]) - np.maximum(boxes[:, 0], b[0])
+        h = np.minimum(boxes[:, 3], b[3]) - np.maximum(boxes[:, 1], b[1])
+        contains = (boxes[:, 0] <= b[0]) & (boxes[:, 1] <= b[1]) & (boxes[:, 2] >= b[2]) & (boxes[:, 3] >= b[3])
+        hits = np.flatnonzero((w > min_overlap) & (h > min_overlap) & ~(graph & contains))
+        # Each text pair once (two copies of one string included), and not
+        # the text against itself
+        hits = hits[graph[hits] | (hits > i)]
+        for j in hits:
+            overlaps.append((str(kinds[j]), names[i], names[j], float(w[j]), float(h[j])))
+    return overlaps
+
+
+def dry_run(scene_cls, seed=0, min_overlap=0.02, **scene_kwargs):
+    # Run construct with every play skipped and nothing rasterized or encoded.
+    # Animations still jump to their end state, so positions, boxes and run
+    # times are those of the real render. Layout is checked after every play.
+    from manim import tempconfig
+
+    start = time.perf_counter()
+    with tempconfig({"dry_run": True, "skip_animations": True, "disable_caching": True}):
+        seed_everything(seed)
+        scene = scene_cls(**scene_kwargs)
+        renderer = scene.renderer
+        # Skipped plays still draw the static frame and frozen frames
+        renderer.update_frame = lambda *args, **kwargs: None
+        renderer.render = lambda *args, **kwargs: None
+        renderer.save_static_frame_data = lambda *args, **kwargs: None
+        renderer.freeze_current_frame = lambda duration: None
+
+        durations = []
+        overlaps = {}
+        play = scene.play
+
+        def measured_play(*args, **kwargs):
+            before = renderer.time
+            result = play(*args, **kwargs)
+            durations.append(renderer.time - before)
+            for overlap in find_overlaps(scene.mobjects, min_overlap):
+                overlaps.setdefault(overlap[:3], (len(durations) - 1,) + overlap[3:])
+            return result
+
+        # Scene.wait goes through self.play, so this sees every play
+        scene.play = measured_play
+        scene.render()
+        boundaries = list(getattr(scene, "step_boundaries", []))
+
+    clock = np.r_[0, np.cumsum(durations)]
+    names = {first: name for name, first, *_ in boundaries if 0 <= first < len(durations)}
+    names.setdefault(0, "start")
+    firsts = sorted(names)
+    steps = [{"name": names[a], "start": float(clock[a]), "duration": float(clock[b] - clock[a]), "plays": b - a}
+             for a, b in zip(firsts, firsts[1:] + [len(durations)]) if b > a]
+    step_at = np.searchsorted(firsts, np.arange(len(durations)), side="right") - 1
+    return {
+        "scene": scene_cls.__name__,
+        "duration": float(clock[-1]),
+        "plays": len(durations),
+        "steps": steps,
+        "overlaps": [
+            {"kind": kind, "step": names[firsts[step_at[play_index]]], "time": float(clock[play_index + 1]),
+             "text": text, "other": other, "overlap": [round(w, 3), round(h, 3)]}
+            for (kind, text, other), (play_index, w, h) in sorted(overlaps.items(), key=lambda item: item[1][0])
+        ],
+        "wall_s": time.perf_counter() - start,
+    }
+
+
+def print_report(report):
+    print(f"{report['scene']}: {report['duration']:.1f}s of video in {report['plays']} plays "
+          f"(checked in {report['wall_s']:.1f}s)")
+    for s in report["steps"]:
+        print(f"  {s['start']:7.1f}s  {s['duration']:6.1f}s  {s['plays']:3d} plays  {s['name']}")
+    for o in report["overlaps"]:
+        print(f"  {o['kind'].upper():9s} at {o['time']:.1f}s ({o['step']}): {o['text'][:50]!r} / {o['other'][:50]}")
+
+
+if __name__ == "__main__":
+    from render_farm import scene_class
+
+    parser = argparse.ArgumentParser(description="Check scene timing and text overlaps without rendering")
+    parser.add_argument("scenes", nargs="*", default=["ad_linkage.AdLinkingVisualization",
+                                                      "giant_component.GiantComponentScene",
+                                                      "us_map_scene.HighlightMapScene"],
+                        help="module.Class specs (default: the explainer scenes)")
+    parser.add_argument("--params", default="{}", help="JSON keyword arguments for every scene")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-overlap", type=float, default=0.02, help="ignore overlaps thinner than this")
+    parser.add_argument("-o", "--output", default=None, help="also write the reports as JSON")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 if anything overlaps")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    reports = [dry_run(scene_class(spec), args.seed, args.min_overlap, **json.loads(args.params))
+               for spec in args.scenes]
+    for report in reports:
+        print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
+    sys.exit(1 if args.strict and any(r["overlaps"] for r in reports) else 0)
@@ -0,0 +1,168 @@
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def expand_frontier(indptr, indices, frontier):
+    # (source, neighbor) for every edge leaving the frontier, in one gather
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return np.repeat(frontier, counts), indices[offsets]
+
+
+def bridges_and_articulation_points(indptr, indices, roots=None):
+    # Tarjan's lowpoint DFS, iterative so deep graphs don't hit the recursion
+    # limit. Only the components containing roots are searched (all of them by
+    # default). Returns (bridges as (parent, child) pairs, articulation mask).
+    # The DFS is inherently sequential; it runs over plain lists because scalar
+    # list indexing is several times cheaper than ndarray indexing.
+    n = len(indptr) - 1
+    ptr = np.asarray(indptr).tolist()
+    adj = np.asarray(indices).tolist()
+    it = ptr[:-1]
+    end = ptr[1:]
+    disc = [-1] * n
+    low = [0] * n
+    parent = [-1] * n
+    skipped = bytearray(n)
+    articulation = np.zeros(n, dtype=bool)
+    bridges = []
+    timer = 0
+
+    for root in range(n) if roots is None else np.asarray(roots).tolist():
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        root_children = 0
+        stack = [root]
+        while stack:
+            v = stack[-1]
+            i = it[v]
+            if i < end[v]:
+                it[v] = i + 1
+                w = adj[i]
+                if disc[w] == -1:
+                    parent[w] = v
+                    disc[w] = low[w] = timer
+                    timer += 1
+                    stack.append(w)
+                elif w == parent[v] and not skipped[v]:
+                    # Skip the tree edge back to the parent once; a duplicate
+                    # edge to the parent still counts as a back edge
+                    skipped[v] = 1
+                elif disc[w] < low[v]:
+                    low[v] = disc[w]
+                continue
+            stack.pop()
+            p = parent[v]
+            if p < 0:
+                continue
+            if low[v] < low[p]:
+                low[p] = low[v]
+            if low[v] > disc[p]:
+                bridges.append((p, v))
+            if parent[p] < 0:
+                root_children += 1
+            elif low[v] >= disc[p]:
+                articulation[p] = True
+        if root_children > 1:
+            articulation[root] = True
+
+    return np.array(bridges, dtype=np.int64).reshape(-1, 2), articulation
+
+
+def sampled_betweenness(indptr, indices, sources=None, samples=32, seed=0):
+    # Brandes' betweenness from a random sample of sources, scaled up to
+    # estimate the full sum. Each BFS level and each dependency sweep is one
+    # vectorized gather/bincount over the frontier's edges.
+    indptr = np.asarray(indptr)
+    indices = np.asarray(indices)
+    n = len(indptr) - 1
+    rng = np.random.default_rng(seed)
+    pool = np.arange(n) if sources is None else np.asarray(sources)
+    chosen = rng.choice(pool, min(samples, len(pool)), replace=False)
+    centrality = np.zeros(n)
+
+    for s in chosen:
+        dist = np.full(n, -1, dtype=np.int32)
+        sigma = np.zeros(n)
+        dist[s] = 0
+        sigma[s] = 1
+        frontier = np.array([s])
+        levels = []
+        depth = 0
+        while len(frontier):
+            src, dst = expand_frontier(indptr, indices, frontier)
+            fresh = dist[dst] == -1
+            dist[dst[fresh]] = depth + 1
+            # Shortest-path DAG edges into the next level
+            forward = dist[dst] == depth + 1
+            src, dst = src[forward], dst[forward]
+            sigma += np.bincount(dst, weights=sigma[src], minlength=n)
+            levels.append((src, dst))
+            frontier = np.unique(dst)
+            depth += 1
+
+        delta = np.zeros(n)
+        for src, dst in reversed(levels):
+            delta += np.bincount(src, weights=sigma[src] / sigma[dst] * (1 + delta[dst]), minlength=n)
+        delta[s] = 0
+        centrality += delta
+
+    return centrality * len(pool) / max(len(chosen), 1)
+
+
+def components_without(indptr, indices, removed):
+    # Component labels after deleting the removed nodes (removed nodes get -1)
+    indptr = np.asarray(indptr)
+    indices = np.asarray(indices)
+    n = len(indptr) - 1
+    cut = np.zeros(n, dtype=bool)
+    cut[removed] = True
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    keep = ~cut[rows] & ~cut[indices]
+    matrix = csr_matrix((np.ones(int(keep.sum()), dtype=np.int8), (rows[keep], indices[keep])), shape=(n, n))
+    _, labels = connected_components(matrix, directed=False)
+    labels[cut] = -1
+    return labels
+
+
+def find_false_links(graph, component=0, count=10, samples=32, seed=0):
+    # Attribute nodes most likely to be gluing unrelated clusters together:
+    # articulation points of the component (removing one disconnects it),
+    # ranked by estimated betweenness. graph is a graph_store.StoredGraph.
+    # Returns (glue nodes, bridge edges, labels once the glue nodes are cut).
+    indptr, indices = np.asarray(graph.indptr), np.asarray(graph.indices)
+    nodes = graph.component_nodes(component)
+    bridges, articulation = bridges_and_articulation_points(indptr, indices, roots=nodes[:1])
+    candidates = nodes[articulation[nodes] & (np.asarray(graph.kinds)[nodes] != 0)]
+    if not len(candidates):
+        return candidates, bridges, np.asarray(graph.labels).copy()
+    centrality = sampled_betweenness(indptr, indices, sources=nodes, samples=samples, seed=seed)
+    glue = candidates[np.argsort(-centrality[candidates], kind="stable")[:count]]
+    return glue, bridges, components_without(indptr, indices, glue)
+
+
+def cached_false_links(graph, count=10, samples=32, seed=0):
+    # find_false_links for the giant component, saved next to the graph store
+    # so every render process after the first loads the result instead of
+    # searching the graph again. save_graph writes the manifest last, so its
+    # mtime changes whenever the store is rewritten and stale results are
+    # never picked up.
+    stamp = os.stat(os.path.join(graph.directory, "manifest.json")).st_mtime_ns
+    path = os.path.join(graph.directory, f"false_links_{count}_{samples}_{seed}_{stamp:x}.npz")
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["glue"], data["bridges"], data["labels"]
+    glue, bridges, labels = find_false_links(graph, 0, count, samples, seed)
+    # Parallel render processes may all compute this; write to a private temp
+    # file and rename so none of them reads a partial file
+    tmp_path = f"{os.path.splitext(path)[0]}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, glue=glue, bridges=bridges, labels=labels)
+    os.replace(tmp_path, path)
+    return glue, bridges, labels
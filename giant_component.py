@@ -2,40 +2,215 @@ from manim import *
 import numpy as np
 import random
 
-class GiantComponentScene(Scene):
+from false_links import cached_false_links
+from graph_store import DEFAULT_STORE, load_graph
+from labels import label
+from layout import fit_to_box, force_layout, interpolate_frames
+from level_of_detail import LevelOfDetailMovingCamera
+from render_driver import mark_step
+
+
+def cluster_layout(num_clusters, nodes_per_cluster, center_radius=3.0, cluster_radius=0.8,
+                   vertical_offset=1.5, spiral=False):
+    # Positions for every node in one NumPy pass, shape (num_clusters, nodes_per_cluster, 3).
+    # Index 0 of each cluster is its central node, the rest sit on a ring around it.
+    k = np.arange(num_clusters)
+    if spiral:
+        # Sunflower spiral fills a disk evenly so thousands of clusters don't overlap
+        r = center_radius * np.sqrt((k + 0.5) / num_clusters)
+        cluster_angle = k * np.pi * (3 - np.sqrt(5))
+        cluster_radius = min(cluster_radius, 0.45 * center_radius / np.sqrt(num_clusters))
+    else:
+        r = np.full(num_clusters, center_radius)
+        cluster_angle = 2 * np.pi * k / num_clusters
+    centers = np.stack([r * np.cos(cluster_angle), r * np.sin(cluster_angle), np.zeros(num_clusters)], axis=1)
+    centers += DOWN * vertical_offset
+
+    j = np.arange(1, nodes_per_cluster)
+    theta = j * 2 * np.pi / max(nodes_per_cluster - 1, 1)
+    ring = cluster_radius * np.stack([np.cos(theta), np.sin(theta), np.zeros_like(theta)], axis=1)
+
+    positions = np.empty((num_clusters, nodes_per_cluster, 3))
+    positions[:, 0] = centers
+    positions[:, 1:] = centers[:, None, :] + ring[None, :, :]
+    return positions
+
+
+def segment_points(starts, ends):
+    # Bezier points for straight segments, four anchors/handles per segment
+    starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 3)
+    delta = ends - starts
+    return np.stack([starts, starts + delta / 3, starts + 2 * delta / 3, ends], axis=1).reshape(-1, 3)
+
+
+def segments_path(starts, ends, **kwargs):
+    # One VMobject holding every segment as its own straight cubic subpath,
+    # instead of one Line mobject per edge
+    path = VMobject(**kwargs)
+    path.set_points(segment_points(starts, ends))
+    return path
+
+
+def spoke_edges(num_clusters, nodes_per_cluster):
+    # (center, outer) flat node index pairs, in the order edges are drawn
+    centers = np.arange(num_clusters) * nodes_per_cluster
+    outer = centers[:, None] + np.arange(1, nodes_per_cluster)
+    return np.stack([np.repeat(centers, nodes_per_cluster - 1), outer.ravel()], axis=1)
+
+
+def point_cloud(points, colors, stroke_width=4):
+    # One PMobject for all nodes; colors is a list of per-point colors
+    cloud = PMobject(stroke_width=stroke_width)
+    rgbas = np.array([color_to_rgba(c) for c in colors])
+    cloud.add_points(np.asarray(points, dtype=float).reshape(-1, 3), rgbas=rgbas)
+    return cloud
+
+
+class GiantComponentScene(MovingCameraScene):
+    # Above this many nodes the scene switches to batched point-cloud rendering
+    BATCH_THRESHOLD = 500
+
+    def __init__(self, num_clusters=8, nodes_per_cluster=6, batched=None, seed=None, layout="rings",
+                 ads_export=None, limit=None, zoom_on=None, text_pairs=None, **kwargs):
+        if batched is None:
+            batched = num_clusters * nodes_per_cluster > self.BATCH_THRESHOLD
+        if not batched:
+            # One Dot and Line per node and edge: the camera merges runs of
+            # settled, same-colored ones into single paths. Batched mode
+            # already draws a few mobjects and keeps the stock camera.
+            kwargs.setdefault("camera_class", LevelOfDetailMovingCamera)
+        super().__init__(**kwargs)
+        self.num_clusters = num_clusters
+        self.nodes_per_cluster = nodes_per_cluster
+        # "rings" keeps the fixed cluster layout, "force" lets the falsely
+        # linked graph settle under a force-directed layout
+        self.layout = layout
+        self.seed = seed
+        self.batched = batched
+        # Without a seed, draw one from the global NumPy state so a seeded render
+        # (e.g. every section process of render_driver) reproduces the graph
+        self.rng = np.random.default_rng(seed if seed is not None else np.random.randint(2**31))
+        # With an export, the cross-links are the real ones: pairs of its
+        # largest people that post the same over-shared text (random ones
+        # remain if the export has none). They are read from a cache next to
+        # the export, or passed in as text_pairs (an empty one draws no
+        # cross-links).
+        if text_pairs is None and ads_export is not None:
+            from text_index import cached_generic_text_links
+
+            text_pairs = cached_generic_text_links(ads_export, num_clusters, limit=limit) or None
+        self.text_pairs = None if text_pairs is None else np.asarray(text_pairs, dtype=int).reshape(-1, 2)
+        # Cluster index to zoom in on after the clusters merge, or None
+        self.zoom_on = zoom_on
+
     def construct(self):
-        title = Text("Let's look at a small set of data.", font_size=24).to_edge(UP)
+        mark_step(self, "clusters")
+        title = label("Let's look at a small set of data.", font_size=24).to_edge(UP)
         self.play(Write(title))
         self.wait(1)
 
         # Create icon-like central nodes and spokes (image/phone/text representation)
-        num_clusters = 8
-        nodes_per_cluster = 6
-        all_nodes = []
-        node_groups = []
-        edges = []
+        num_clusters = self.num_clusters
+        nodes_per_cluster = self.nodes_per_cluster
         cluster_radius = 0.8
         node_radius = 0.12
         center_radius = 3.0
         vertical_offset = 1.5  # shift nodes downward to avoid overlapping text
 
-        for i in range(num_clusters):
-            cluster_nodes = []
-            cluster_angle = 2 * np.pi * i / num_clusters
-            cluster_center = center_radius * np.array([np.cos(cluster_angle), np.sin(cluster_angle), 0]) + DOWN * vertical_offset
+        positions = cluster_layout(num_clusters, nodes_per_cluster, center_radius, cluster_radius,
+                                   vertical_offset, spiral=self.batched)
 
-            # Create a central node (red, to visually separate)
-            center_node = Dot(cluster_center, radius=node_radius + 0.05, color=RED)
-            cluster_nodes.append(center_node)
-            all_nodes.append(center_node)
+        if self.batched:
+            all_nodes, edges = self.show_batched_clusters(positions)
+        else:
+            all_nodes, edges, node_groups = self.show_clusters(positions, node_radius)
+
+        self.wait(1)
+        mark_step(self, "false_links")
+        self.play(FadeOut(title))
+        warning = label("But, the issues we saw earlier can cause clusters to get falsely linked?", font_size=24).to_edge(UP)
+        self.play(Write(warning))
+        self.wait(1)
+
+        # Cross-links between central nodes (false connections)
+        if self.text_pairs is not None:
+            pairs = self.text_pairs
+        elif self.batched:
+            num_links = max(8, num_clusters // 4)
+            pairs = np.array([self.rng.choice(num_clusters, 2, replace=False) for _ in range(num_links)])
+        else:
+            pairs = np.array([random.sample(range(num_clusters), 2) for _ in range(8)])
+        if not len(pairs):
+            cross_links = []
+        elif self.batched:
+            cross_links = [segments_path(positions[pairs[:, 0], 0], positions[pairs[:, 1], 0],
+                                         stroke_color=RED, stroke_width=1)]
+        else:
+            cross_links = []
+            for c1, c2 in pairs:
+                node1, node2 = node_groups[c1][0], node_groups[c2][0]
+                link = Line(node1.get_center(), node2.get_center(), color=RED, stroke_width=2)
+                cross_links.append(link)
+        if cross_links:
+            self.play(*[Create(link) for link in cross_links], run_time=2)
+
+        if self.layout == "force":
+            self.settle_layout(positions, pairs, all_nodes, edges, cross_links)
+
+        self.wait(1)
+        mark_step(self, "insights_lost")
+        self.play(FadeOut(warning))
+
+        insight_text = label("Now we can’t tell who’s who. Insights are lost.", font_size=24).to_edge(UP)
+        self.play(Transform(warning, insight_text))
+        self.wait(2)
+
+        if self.zoom_on is not None:
+            if self.batched:
+                cluster = all_nodes[0].points.reshape(num_clusters, nodes_per_cluster, 3)[self.zoom_on]
+            else:
+                cluster = np.array([node.get_center() for node in node_groups[self.zoom_on]])
+            self.focus_on(cluster)
+
+        # Optional: subtle jitter for organic look
+        if self.batched:
+            jittered = all_nodes[0].copy()
+            jittered.points[:, :2] += 0.05 * self.rng.standard_normal((len(jittered.points), 2))
+            self.play(Transform(all_nodes[0], jittered), run_time=1)
+        else:
+            self.play(*[node.animate.shift(0.05 * RIGHT * np.random.randn() + 0.05 * UP * np.random.randn()) for node in all_nodes], run_time=1)
+        self.wait(1)
 
+        # Fade everything out
+        self.play(FadeOut(title), FadeOut(insight_text),
+                  *[FadeOut(mob) for mob in all_nodes + edges + cross_links])
+        self.wait(1)
+
+    def focus_on(self, points, margin=2.0, run_time=1.5):
+        # Zoom the camera onto points and back out. Zoomed in, the level of
+        # detail camera draws the cluster's nodes and labels in full again.
+        mark_step(self, "zoom")
+        frame = self.camera.frame
+        frame.save_state()
+        lo, hi = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+        width = max(hi[0] - lo[0], (hi[1] - lo[1]) * frame.width / frame.height, 0.5) * margin
+        center = np.r_[(lo + hi) / 2, 0]
+        self.play(frame.animate.set(width=width).move_to(center), run_time=run_time)
+        self.wait(1)
+        self.play(Restore(frame), run_time=run_time)
+
+    def show_clusters(self, positions, node_radius):
+        # One Dot/Line mobject per node/edge, animated cluster by cluster
+        all_nodes = []
+        node_groups = []
+        edges = []
+        for cluster in positions:
+            # Create a central node (red, to visually separate)
+            center_node = Dot(cluster[0], radius=node_radius + 0.05, color=RED)
             # Add outer nodes (images/phones/etc.) around the center
-            for j in range(1, nodes_per_cluster):
-                theta = j * 2 * np.pi / (nodes_per_cluster - 1)
-                pos = cluster_center + cluster_radius * np.array([np.cos(theta), np.sin(theta), 0])
-                node = Dot(pos, radius=node_radius, color=WHITE)
-                cluster_nodes.append(node)
-                all_nodes.append(node)
+            cluster_nodes = [center_node] + [Dot(pos, radius=node_radius, color=WHITE) for pos in cluster[1:]]
+            all_nodes.extend(cluster_nodes)
             node_groups.append(cluster_nodes)
 
         # Show nodes
@@ -52,34 +227,166 @@ class GiantComponentScene(Scene):
             edges.extend(local_edges)
             self.play(*[Create(edge) for edge in local_edges], run_time=0.4)
 
-        self.wait(1)
-        self.play(FadeOut(title))
-        warning = Text("But, the issues we saw earlier can cause clusters to get falsely linked?", font_size=24).to_edge(UP)
-        self.play(Write(warning))
-        self.wait(1)
+        return all_nodes, edges, node_groups
 
-        # Cross-links between central nodes (false connections)
-        cross_links = []
-        central_nodes = [group[0] for group in node_groups]
-        for _ in range(8):
-            node1, node2 = random.sample(central_nodes, 2)
-            link = Line(node1.get_center(), node2.get_center(), color=RED, stroke_width=2)
-            cross_links.append(link)
-        self.play(*[Create(link) for link in cross_links], run_time=2)
+    def show_batched_clusters(self, positions):
+        # All nodes as one point cloud and all spokes as one multi-segment path,
+        # shown with a single play each regardless of graph size
+        num_clusters, nodes_per_cluster, _ = positions.shape
+        colors = ([RED] + [WHITE] * (nodes_per_cluster - 1)) * num_clusters
+        nodes = point_cloud(positions, colors)
+
+        starts = np.broadcast_to(positions[:, :1], positions[:, 1:].shape)
+        edges = segments_path(starts, positions[:, 1:], stroke_color=WHITE, stroke_width=0.5)
+
+        self.play(FadeIn(nodes), run_time=1)
+        self.play(Create(edges), run_time=1.5)
+        return [nodes], [edges]
+
+    def settle_layout(self, positions, cross_pairs, all_nodes, edges, cross_links, run_time=3):
+        # Relax the clusters and false links with a force-directed layout and
+        # animate the per-iteration keyframes as the graph pulls together
+        num_clusters, nodes_per_cluster, _ = positions.shape
+        flat = positions.reshape(-1, 3)
+        spokes = spoke_edges(num_clusters, nodes_per_cluster)
+        links = np.asarray(cross_pairs).reshape(-1, 2) * nodes_per_cluster
+        width, height = np.ptp(flat[:, :2], axis=0)
+        _, frames = force_layout(len(flat), np.vstack([spokes, links]), iterations=60, initial=flat,
+                                 width=width, height=height, seed=self.seed or 0, keyframes=True)
 
+        def apply_positions(mob, alpha):
+            pos = np.zeros((len(flat), 3))
+            pos[:, :2] = interpolate_frames(frames, alpha)
+            if self.batched:
+                all_nodes[0].points = pos
+                edges[0].set_points(segment_points(pos[spokes[:, 0]], pos[spokes[:, 1]]))
+                if cross_links:
+                    cross_links[0].set_points(segment_points(pos[links[:, 0]], pos[links[:, 1]]))
+            else:
+                for node, p in zip(all_nodes, pos):
+                    node.move_to(p)
+                for edge, (a, b) in zip(edges + cross_links, np.vstack([spokes, links])):
+                    edge.put_start_and_end_on(pos[a], pos[b])
+
+        graph = Group(*all_nodes, *edges, *cross_links)
+        self.play(UpdateFromAlphaFunc(graph, apply_positions), run_time=run_time)
+
+
+class LargeGiantComponentScene(GiantComponentScene):
+    # Realistically sized graph for the giant component story
+    def __init__(self, **kwargs):
+        kwargs.setdefault("num_clusters", 2000)
+        kwargs.setdefault("nodes_per_cluster", 6)
+        super().__init__(**kwargs)
+
+
+class StoredGiantComponentScene(Scene):
+    # The giant component of a real crawl, drawn from a graph saved by
+    # graph_store. Its arrays are memory-mapped, so rendering does no linkage
+    # or layout work and parallel section processes share one copy.
+    def __init__(self, graph_dir=DEFAULT_STORE, max_nodes=20000, cut_false_links=True, num_cuts=10, **kwargs):
+        super().__init__(**kwargs)
+        self.graph = load_graph(graph_dir)
+        self.max_nodes = max_nodes
+        # Find the attribute nodes gluing the giant component together and
+        # animate cutting them
+        self.cut_false_links = cut_false_links
+        self.num_cuts = num_cuts
+
+    def construct(self):
+        graph = self.graph
+        if graph.positions is None:
+            raise ValueError("Graph store has no layout; save it with layout_iterations > 0")
+
+        false_links = cached_false_links(graph, self.num_cuts) if self.cut_false_links else None
+        # Largest components first, as many as fit in max_nodes
+        node_counts = np.bincount(graph.labels)
+        shown = int(np.searchsorted(np.cumsum(node_counts), self.max_nodes, side="right"))
+        if shown:
+            nodes = np.flatnonzero(np.asarray(graph.labels) < shown)
+        else:
+            # The giant component alone is over budget: draw a random sample of
+            # its nodes, always including the glue nodes that get cut
+            glue = false_links[0] if false_links is not None else np.zeros(0, dtype=np.int64)
+            rest = np.setdiff1d(graph.component_nodes(0), glue)
+            rng = np.random.default_rng(0)
+            sample = rng.choice(rest, max(self.max_nodes - len(glue), 0), replace=False)
+            nodes = np.union1d(sample, glue)
+        index = np.full(len(graph), -1)
+        index[nodes] = np.arange(len(nodes))
+        edges = index[graph.edges(nodes)]
+        positions = fit_to_box(graph.positions[nodes], DOWN * 0.5, 12, 6)
+        giant = np.asarray(graph.labels[nodes]) == 0
+
+        mark_step(self, "clusters")
+        sizes = graph.component_sizes()
+        title = label(f"{graph.manifest['ads']:,} ads from a real crawl", font_size=24).to_edge(UP)
+        self.play(Write(title))
+        colors = [WHITE if kind == 0 else BLUE for kind in graph.kinds[nodes]]
+        cloud = point_cloud(positions, colors, stroke_width=2)
+        links = segments_path(positions[edges[:, 0]], positions[edges[:, 1]], stroke_color=WHITE,
+                              stroke_width=0.3, stroke_opacity=0.5)
+        self.play(FadeIn(cloud), run_time=1)
+        self.play(Create(links), run_time=1.5)
         self.wait(1)
-        self.play(FadeOut(warning))
 
-        insight_text = Text("Now we can’t tell who’s who. Insights are lost.", font_size=24).to_edge(UP)
-        self.play(Transform(warning, insight_text))
+        mark_step(self, "giant_component")
+        share = sizes[0] / max(graph.manifest["ads"], 1)
+        caption = label(f"{share:.0%} of them fall into a single component", font_size=24).to_edge(UP)
+        giant_edges = edges[giant[edges[:, 0]]]
+        highlight = segments_path(positions[giant_edges[:, 0]], positions[giant_edges[:, 1]],
+                                  stroke_color=RED, stroke_width=0.6)
+        self.play(Transform(title, caption))
+        self.play(Create(highlight), run_time=2)
         self.wait(2)
 
-        # Optional: subtle jitter for organic look
-        self.play(*[node.animate.shift(0.05 * RIGHT * np.random.randn() + 0.05 * UP * np.random.randn()) for node in all_nodes], run_time=1)
+        if self.cut_false_links:
+            highlight = self.cut_glue_nodes(false_links, title, nodes, index, edges, positions, highlight)
+
+        self.play(FadeOut(title), FadeOut(cloud), FadeOut(links), FadeOut(highlight))
         self.wait(1)
 
-        # Fade everything out
-        self.play(FadeOut(title), FadeOut(insight_text),
-                  *[FadeOut(mob) for mob in all_nodes + edges + cross_links])
+    def cut_glue_nodes(self, false_links, title, nodes, index, edges, positions, highlight):
+        # Mark the shared images/phones/texts holding the giant component
+        # together, cut them, and recolor the pieces it falls apart into
+        mark_step(self, "false_links")
+        glue, _, labels_after = false_links
+        glue = glue[index[glue] >= 0]
+        if not len(glue):
+            return highlight
+        glue_points = positions[index[glue]]
+        markers = VGroup(*[Circle(radius=0.12, color=YELLOW, stroke_width=3).move_to(p) for p in glue_points])
+        caption = label(f"{len(glue)} shared attributes glue it together", font_size=24).to_edge(UP)
+        self.play(Transform(title, caption), Create(markers), run_time=1.5)
         self.wait(1)
 
+        # Edges touching a glue node disappear; the rest of the old giant
+        # component is colored by the piece it ends up in, largest first
+        was_giant = np.asarray(self.graph.labels)[nodes][edges[:, 0]] == 0
+        kept = was_giant & ~np.isin(edges, index[glue]).any(axis=1)
+        pieces = edges[kept]
+        piece_labels = labels_after[nodes][pieces[:, 0]]
+        # Piece sizes count only nodes of the former giant component; the
+        # other components keep their labels and are not pieces of it
+        giant = np.asarray(self.graph.labels) == 0
+        sizes = np.bincount(labels_after[giant & (labels_after >= 0)], minlength=max(int(labels_after.max()) + 1, 1))
+        largest = sizes.max()
+        palette = [RED, ORANGE, GREEN, TEAL, PURPLE, PINK, GOLD, MAROON]
+        # The largest pieces get their own color, the long tail shares the
+        # last one, so this is at most len(palette) paths
+        unique, inverse = np.unique(piece_labels, return_inverse=True)
+        rank = np.empty(len(unique), dtype=int)
+        rank[np.argsort(-sizes[unique], kind="stable")] = np.arange(len(unique))
+        color_index = np.minimum(rank[inverse], len(palette) - 1)
+        pieces_group = VGroup()
+        for i, color in enumerate(palette):
+            chosen = pieces[color_index == i]
+            if len(chosen):
+                pieces_group.add(segments_path(positions[chosen[:, 0]], positions[chosen[:, 1]],
+                                               stroke_color=color, stroke_width=0.6))
+
+        giant_nodes = int((np.asarray(self.graph.labels) == 0).sum())
+        result = label(f"Cut them and the largest piece keeps {largest / giant_nodes:.0%} of the nodes", font_size=24).to_edge(UP)
+        self.play(FadeOut(markers), FadeOut(highlight), FadeIn(pieces_group), Transform(title, result), run_time=2)
+        self.wait(2)
+        return pieces_group
@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+
+from layout import force_layout
+
+STORE_VERSION = 1
+DEFAULT_STORE = os.path.join("media", "graph_store")
+KIND_CODES = {"ad": 0, "phone": 1, "image": 2, "text": 3}
+
+
+def build_arrays(engine):
+    # CSR adjacency of the bipartite ad/attribute graph plus per-node component
+    # labels (0 is the largest component) and node kinds
+    n = len(engine.uf)
+    ad_nodes = np.asarray(engine.ad_nodes, dtype=np.int64)
+    counts = np.fromiter((len(a) for a in engine.ad_attributes), dtype=np.int64, count=len(ad_nodes))
+    src = np.repeat(ad_nodes, counts)
+    dst = np.fromiter((attr for attrs in engine.ad_attributes for attr in attrs), dtype=np.int64, count=int(counts.sum()))
+
+    # Each edge appears in both directions; sort by source to get CSR rows
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    order = np.argsort(rows, kind="stable")
+    indices = cols[order].astype(np.int32 if n < 2**31 else np.int64)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    find = engine.uf.find
+    roots = np.fromiter((find(i) for i in range(n)), dtype=np.int64, count=n)
+    unique, inverse = np.unique(roots, return_inverse=True)
+    sizes = np.bincount(inverse[ad_nodes], minlength=len(unique))
+    rank = np.empty(len(unique), dtype=np.int64)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(unique))
+    labels = rank[inverse].astype(np.int32)
+
+    kinds = np.zeros(n, dtype=np.int8)
+    for node, (kind, _) in engine.attr_keys.items():
+        kinds[node] = KIND_CODES[kind]
+
+    return {"indptr": indptr, "indices": indices, "labels": labels, "kinds": kinds, "ad_nodes": ad_nodes}
+
+
+def save_graph(engine, directory=DEFAULT_STORE, layout_iterations=50, seed=0):
+    # Write the linkage graph as raw .npy arrays (loaded memory-mapped) and a
+    # small JSON manifest. Set layout_iterations=0 to skip the layout.
+    os.makedirs(directory, exist_ok=True)
+    arrays = build_arrays(engine)
+    if layout_iterations:
+        indptr, indices = arrays["indptr"], arrays["indices"]
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        edges = np.stack([rows, indices], axis=1)
+        edges = edges[edges[:, 0] < edges[:, 1]]
+        arrays["positions"] = force_layout(len(indptr) - 1, edges, iterations=layout_iterations,
+                                           seed=seed).astype(np.float32)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + ".npy"), array)
+    manifest = {
+        "version": STORE_VERSION,
+        "nodes": int(len(arrays["kinds"])),
+        "ads": int(len(arrays["ad_nodes"])),
+        "edges": int(len(arrays["indices"]) // 2),
+        "components": int(arrays["labels"].max()) + 1 if len(arrays["labels"]) else 0,
+        "arrays": sorted(arrays),
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return directory
+
+
+class StoredGraph:
+    # Read-only view of a saved linkage graph. Arrays are np.memmap-backed, so
+    # loading is instant and render processes on one machine share the pages.
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] != STORE_VERSION:
+            raise ValueError(f"Unsupported graph store version {self.manifest['version']}")
+        for name in self.manifest["arrays"]:
+            setattr(self, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r"))
+        if not hasattr(self, "positions"):
+            self.positions = None
+        self._component_order = None
+
+    def __len__(self):
+        return self.manifest["nodes"]
+
+    def neighbors(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edges(self, nodes=None):
+        # (u, v) pairs with u < v, optionally restricted to edges inside nodes
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        pairs = np.stack([rows, np.asarray(self.indices)], axis=1)
+        pairs = pairs[pairs[:, 0] < pairs[:, 1]]
+        if nodes is not None:
+            inside = np.zeros(len(self), dtype=bool)
+            inside[nodes] = True
+            pairs = pairs[inside[pairs[:, 0]] & inside[pairs[:, 1]]]
+        return pairs
+
+    def component_nodes(self, label):
+        # Nodes of one component; labels are ranked by ad count, 0 is largest
+        if self._component_order is None:
+            self._component_order = np.argsort(self.labels, kind="stable")
+            self._component_ptr = np.searchsorted(self.labels[self._component_order],
+                                                  np.arange(self.manifest["components"] + 1))
+        start, end = self._component_ptr[label], self._component_ptr[label + 1]
+        return self._component_order[start:end]
+
+    def component_sizes(self):
+        # Ads per component, indexed by label
+        return np.bincount(self.labels[self.ad_nodes], minlength=self.manifest["components"])
+
+
+def load_graph(directory=DEFAULT_STORE):
+    return StoredGraph(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from ad_stream import stream_ads, window
+    from linkage import LinkageEngine
+
+    parser = argparse.ArgumentParser(description="Link a crawl export once and save the graph for the scenes")
+    parser.add_argument("path", help="JSONL or CSV export, optionally gzipped")
+    parser.add_argument("-o", "--output", default=DEFAULT_STORE)
+    parser.add_argument("--limit", type=int, default=None, help="only read this many ads")
+    parser.add_argument("--layout-iterations", type=int, default=50, help="0 skips the layout")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="also link ads whose perceptual image hashes are near-duplicates")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = LinkageEngine(keep_records=False)
+    ads = window(stream_ads(args.path), 0, args.limit)
+    if args.near_duplicates:
+        from image_index import merge_near_duplicates, near_duplicate_map
+
+        ads = merge_near_duplicates(window(stream_ads(args.path), 0, args.limit),
+                                    near_duplicate_map(ads))
+    engine.add_ads(ads)
+    save_graph(engine, args.output, args.layout_iterations)
+    print(f"{len(engine)} ads, {len(engine.uf)} nodes -> {args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,241 @@
+import json
+import os
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Set bits per byte value, for Hamming distances between uint64 arrays
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(image, hash_size=8):
+    # Difference hash: shrink to (hash_size + 1) x hash_size grayscale and
+    # record whether each pixel is brighter than its right neighbour. Survives
+    # resizing, recompression and small edits, so reposted copies of an image
+    # land within a few bits of each other.
+    from PIL import Image
+
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0]) if hash_size == 8 else int("".join("1" if b else "0" for b in bits), 2)
+
+
+def parse_hash(value):
+    # Crawl exports carry perceptual hashes as 16 hex digits; other image ids
+    # (file digests, URLs) only ever match exactly and are left to the linkage
+    if len(value) == 16:
+        try:
+            return int(value, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def format_hash(value):
+    return f"{int(value):016x}"
+
+
+def hamming(a, b):
+    x = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    return POPCOUNT[np.ascontiguousarray(x).view(np.uint8)].reshape(x.shape + (8,)).sum(axis=-1)
+
+
+def expand_ranges(lo, hi):
+    # Positions lo[k]..hi[k]-1 for every k, plus which k each came from
+    counts = hi - lo
+    owner = np.repeat(np.arange(len(lo)), counts)
+    return owner, np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+
+class ImageHashIndex:
+    # Multi-index hashing over 64-bit perceptual hashes. Each hash is split into
+    # `bands` chunks kept in sorted arrays; a lookup probes every chunk value
+    # within probe_radius bits of the query's chunk. If two hashes are at most
+    # max_distance apart, at least one chunk differs by at most
+    # max_distance // bands bits, so every match within max_distance is found,
+    # while each probe only touches a bucket of about n / 2**(64 / bands).
+    def __init__(self, bands=4, max_distance=7, max_bucket=10000):
+        if 64 % bands:
+            raise ValueError("bands must divide 64")
+        self.bands = bands
+        self.bits = 64 // bands
+        self.max_distance = max_distance
+        self.probe_radius = max_distance // bands
+        # Buckets larger than this (blank or placeholder images) are skipped
+        self.max_bucket = max_bucket
+        self.masks = np.array([sum(1 << b for b in flips)
+                               for r in range(self.probe_radius + 1)
+                               for flips in combinations(range(self.bits), r)], dtype=np.uint64)
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.sorted = None
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, hashes):
+        # Returns the ids of the new hashes; the band tables are rebuilt lazily
+        hashes = np.asarray(hashes, dtype=np.uint64).ravel()
+        start = len(self.hashes)
+        self.hashes = np.concatenate([self.hashes, hashes])
+        self.sorted = None
+        return np.arange(start, len(self.hashes))
+
+    def band_values(self, hashes, band):
+        return (np.asarray(hashes, dtype=np.uint64) >> np.uint64(band * self.bits)) & np.uint64((1 << self.bits) - 1)
+
+    def build(self):
+        if self.sorted is None:
+            self.sorted = []
+            for band in range(self.bands):
+                values = self.band_values(self.hashes, band)
+                order = np.argsort(values, kind="stable")
+                self.sorted.append((values[order], order))
+        return self.sorted
+
+    def candidates(self, hashes):
+        # (query position, indexed id) pairs sharing a probed chunk value
+        hashes = np.asarray(hashes, dtype=np.uint64).ravel()
+        queries, ids = [], []
+        for band, (values, order) in enumerate(self.build()):
+            probes = self.band_values(hashes, band)[:, None] ^ self.masks[None, :]
+            lo = np.searchsorted(values, probes.ravel(), side="left")
+            hi = np.searchsorted(values, probes.ravel(), side="right")
+            hi = np.where(hi - lo > self.max_bucket, lo, hi)
+            owner, positions = expand_ranges(lo, hi)
+            queries.append(owner // len(self.masks))
+            ids.append(order[positions])
+        return np.concatenate(queries), np.concatenate(ids)
+
+    def query(self, value, max_distance=None):
+        # Ids of indexed hashes within max_distance of value, closest first,
+        # and their distances
+        max_distance = self.max_distance if max_distance is None else max_distance
+        _, ids = self.candidates([value])
+        ids = np.unique(ids)
+        distance = hamming(self.hashes[ids], value)
+        keep = distance <= max_distance
+        order = np.argsort(distance[keep], kind="stable")
+        return ids[keep][order], distance[keep][order]
+
+    def near_duplicate_pairs(self, chunk=1 << 16):
+        # Every (i, j), i < j, of indexed hashes within max_distance. Candidates
+        # are generated and verified a chunk of queries at a time to bound memory.
+        found = [np.zeros((0, 2), dtype=np.int64)]
+        for start in range(0, len(self.hashes), chunk):
+            i, j = self.candidates(self.hashes[start:start + chunk])
+            i += start
+            keep = i < j
+            i, j = i[keep], j[keep]
+            keep = hamming(self.hashes[i], self.hashes[j]) <= self.max_distance
+            found.append(np.unique(np.stack([i[keep], j[keep]], axis=1), axis=0))
+        return np.concatenate(found)
+
+    def clusters(self):
+        # Label per indexed hash; near-duplicates (transitively) share a label
+        pairs = self.near_duplicate_pairs()
+        n = len(self.hashes)
+        graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+        return connected_components(graph, directed=False)[1]
+
+
+def perceptual_hashes(ads):
+    # (ad position, hash string, 64-bit value) for every perceptual hash
+    for position, ad in enumerate(ads):
+        for h in ad.image_hashes:
+            value = parse_hash(h)
+            if value is not None:
+                yield position, h, value
+
+
+def near_duplicate_map(ads, max_distance=7, bands=4):
+    # {hash: canonical hash} for every perceptual hash with a near-duplicate
+    # seen earlier in the stream; the canonical hash is the first-seen member
+    # of its (transitive) near-duplicate cluster
+    values = {}
+    for _, h, value in perceptual_hashes(ads):
+        values.setdefault(h, value)
+    index = ImageHashIndex(bands=bands, max_distance=max_distance)
+    keys = list(values)
+    index.add([values[k] for k in keys])
+    first = {}
+    mapping = {}
+    for key, cluster in zip(keys, index.clusters()):
+        canonical = first.setdefault(cluster, key)
+        if canonical != key:
+            mapping[key] = canonical
+    return mapping
+
+
+def merge_near_duplicates(ads, mapping):
+    # Rewrite image hashes through near_duplicate_map, so LinkageEngine's exact
+    # image matching links ads carrying reposted copies of the same photo
+    for ad in ads:
+        if any(h in mapping for h in ad.image_hashes):
+            ad = ad._replace(image_hashes=tuple(dict.fromkeys(mapping.get(h, h) for h in ad.image_hashes)))
+        yield ad
+
+
+def states_with_image(ads, image_hash, max_distance=7, bands=4):
+    # State of every ad carrying a near-duplicate of image_hash, one per ad
+    owners, states, hashes = [], {}, []
+    for position, ad in enumerate(ads):
+        if not ad.state:
+            continue
+        for h in ad.image_hashes:
+            value = parse_hash(h)
+            if value is not None:
+                owners.append(position)
+                hashes.append(value)
+        states[position] = ad.state
+    index = ImageHashIndex(bands=bands, max_distance=max_distance)
+    index.add(hashes)
+    ids, _ = index.query(image_hash)
+    return [states[position] for position in sorted({owners[i] for i in ids})]
+
+
+def cached_states_with_image(path, image_hash, max_distance=7, bands=4):
+    # states_with_image over a crawl export, saved as JSON next to it and keyed
+    # on the export's size and mtime, so only the first render process (or
+    # section) scans the export and the rest read a short list
+    stat = os.stat(path)
+    cache_path = (f"{path}.states_{format_hash(image_hash)}_{max_distance}_{bands}"
+                  f"_{stat.st_size:x}_{stat.st_mtime_ns:x}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+    from ad_stream import stream_ads
+
+    states = states_with_image(stream_ads(path), image_hash, max_distance, bands)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(states, f)
+    os.replace(tmp_path, cache_path)
+    return states
+
+
+def most_common_state(states):
+    return Counter(states).most_common(1)[0][0] if states else None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print perceptual hashes of images, or find near-duplicates of one")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--export", help="crawl export to search for ads carrying the first image")
+    parser.add_argument("--max-distance", type=int, default=7)
+    args = parser.parse_args()
+
+    hashes = [dhash(path) for path in args.images]
+    for path, value in zip(args.images, hashes):
+        print(format_hash(value), path)
+    if args.export:
+        from ad_stream import stream_ads
+
+        states = states_with_image(stream_ads(args.export), hashes[0], args.max_distance)
+        print(f"{len(states)} ads in {len(set(states))} states: {dict(Counter(states).most_common())}")
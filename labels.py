@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+from manim import DEFAULT_FONT_SIZE, WHITE, Text
+
+
+class LabelCache:
+    # Memoizes laid-out Text mobjects keyed on (string, font, size, color, extra
+    # options) and hands out copies, so each distinct label goes through Pango
+    # layout and SVG conversion once per process. Least recently used entries
+    # are evicted past maxsize.
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, text, font_size=DEFAULT_FONT_SIZE, color=WHITE, font="", **kwargs):
+        # repr rather than the values themselves, which may be unhashable
+        # (t2c={...}, t2w={...})
+        key = (text, font, font_size, str(color), repr(sorted(kwargs.items())))
+        prototype = self.entries.get(key)
+        if prototype is None:
+            self.misses += 1
+            prototype = Text(text, font_size=font_size, color=color, font=font, **kwargs)
+            self.entries[key] = prototype
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return prototype.copy()
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by every scene module in the process
+label_cache = LabelCache()
+
+
+def label(text, **kwargs):
+    return label_cache.get(text, **kwargs)
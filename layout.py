@@ -0,0 +1,96 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def edge_array(edges):
+    edges = np.asarray(edges, dtype=np.int64)
+    return edges.reshape(-1, 2)
+
+
+def accumulate(disp, index, vectors, sign=1.0):
+    # Scatter-add per-pair force vectors onto node displacements; bincount is
+    # much faster than np.add.at for this
+    n = len(disp)
+    disp[:, 0] += sign * np.bincount(index, weights=vectors[:, 0], minlength=n)
+    disp[:, 1] += sign * np.bincount(index, weights=vectors[:, 1], minlength=n)
+
+
+def force_layout(num_nodes, edges, iterations=100, initial=None, width=10.0, height=6.0,
+                 seed=0, gravity=1.0, keyframes=False):
+    # Fruchterman-Reingold layout using the grid variant for repulsion: nodes
+    # only repel within 2k of each other, found with a KD-tree, so an iteration
+    # costs O(n log n + edges) instead of O(n^2). A weak pull towards the center
+    # keeps disconnected components on screen. Deterministic for a given seed.
+    #
+    # Returns (num_nodes, 2) positions, or (positions, frames) with frames of
+    # shape (iterations + 1, num_nodes, 2) when keyframes is True.
+    rng = np.random.default_rng(seed)
+    edges = edge_array(edges)
+    if initial is None:
+        pos = rng.uniform(-0.5, 0.5, (num_nodes, 2)) * [width, height]
+    else:
+        pos = np.array(initial, dtype=float)[:, :2]
+    center = pos.mean(axis=0) if num_nodes else np.zeros(2)
+
+    k = np.sqrt(width * height / max(num_nodes, 1))
+    radius = 0.5 * max(width, height)
+    temperature = 0.1 * max(width, height)
+    cooling = temperature / max(iterations, 1)
+    frames = [pos.copy()] if keyframes else None
+
+    for _ in range(iterations):
+        disp = np.zeros_like(pos)
+
+        # Repulsion k^2 / d between nearby pairs
+        pairs = cKDTree(pos).query_pairs(2 * k, output_type="ndarray")
+        if len(pairs):
+            i, j = pairs[:, 0], pairs[:, 1]
+            delta = pos[i] - pos[j]
+            dist2 = np.maximum((delta ** 2).sum(axis=1), 1e-12)
+            vectors = delta * (k * k / dist2)[:, None]
+            accumulate(disp, i, vectors)
+            accumulate(disp, j, vectors, -1.0)
+
+        # Attraction d^2 / k along edges
+        if len(edges):
+            u, v = edges[:, 0], edges[:, 1]
+            delta = pos[u] - pos[v]
+            dist = np.sqrt((delta ** 2).sum(axis=1))
+            vectors = delta * (dist / k)[:, None]
+            accumulate(disp, u, vectors, -1.0)
+            accumulate(disp, v, vectors)
+
+        # Gravity: a node on the edge of the box is pulled in about as hard as
+        # a single neighbour at distance k pushes it away
+        disp -= gravity * k * (pos - center) / radius
+
+        # Limit each step to the current temperature, then cool down
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-12)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature = max(temperature - cooling, 1e-3 * k)
+        if keyframes:
+            frames.append(pos.copy())
+
+    if keyframes:
+        return pos, np.array(frames)
+    return pos
+
+
+def fit_to_box(positions, center, width, height):
+    # Scale and move 2D positions (any leading shape) into a box, keeping the
+    # aspect ratio, and return them as 3D scene points
+    positions = np.asarray(positions, dtype=float)
+    flat = positions.reshape(-1, 2)
+    lo, hi = flat.min(axis=0), flat.max(axis=0)
+    span = np.maximum(hi - lo, 1e-12)
+    scale = min(width / span[0], height / span[1])
+    fitted = (positions - (lo + hi) / 2) * scale + np.asarray(center, dtype=float)[:2]
+    return np.concatenate([fitted, np.zeros(positions.shape[:-1] + (1,))], axis=-1)
+
+
+def interpolate_frames(frames, alpha):
+    # Positions at alpha in [0, 1] along a (num_frames, n, d) keyframe array
+    x = np.clip(alpha, 0, 1) * (len(frames) - 1)
+    i = int(x)
+    j = min(i + 1, len(frames) - 1)
+    return frames[i] + (x - i) * (frames[j] - frames[i])
@@ -0,0 +1,157 @@
+import numpy as np
+from manim import Camera, MarkupText, MovingCamera, PMobject, SingleStringMathTex, Text, VMobject
+
+TEXT_TYPES = (Text, MarkupText, SingleStringMathTex)
+
+
+class LevelOfDetailCamera:
+    # Camera mixin that decides, every frame, how much of each mobject is worth
+    # drawing at the current zoom. Only what is handed to the rasterizer
+    # changes; the scene's mobjects and animations are untouched, so zooming
+    # back in on a component brings it back in full detail.
+    #  - text shorter than min_label_px on screen is skipped
+    #  - shapes smaller than min_node_px (dots, short edges) are drawn as
+    #    single pixels of one point batch
+    #  - runs of consecutive opaque single-color shapes with nothing else
+    #    drawn between them are merged into one path: strokes without fill
+    #    (edges, e.g. Line) and fills without stroke (nodes, e.g. Dot). Drawn
+    #    as one path they cover the same pixels in the same order, so hundreds
+    #    of them cost one cairo stroke or fill instead of one each.
+    #    Translucent strokes are merged only while thinner than
+    #    max_batched_stroke_px, since overlaps in one path are blended once.
+    #    Text glyphs are never merged.
+    #  - anything entirely outside the frame is skipped
+    # Sizes are in output pixels. Scenes that already draw a few big batched
+    # mobjects gain nothing from this and should keep the stock camera.
+    min_label_px = 4.0
+    min_node_px = 1.5
+    max_batched_stroke_px = 2.0
+
+    def get_mobjects_to_display(self, mobjects, include_submobjects=True, excluded_mobjects=None):
+        mobjects = list(mobjects)
+        hidden, glyphs = self.text_members(mobjects) if include_submobjects else (set(), set())
+        found = super().get_mobjects_to_display(mobjects, include_submobjects, excluded_mobjects)
+        return self.level_of_detail([m for m in found if id(m) not in hidden], glyphs)
+
+    def pixels_per_unit(self):
+        return self.pixel_width / self.frame_width
+
+    def text_members(self, mobjects):
+        # ids of every family member of text too small to read, and of every
+        # other text family member
+        hidden, glyphs = set(), set()
+        limit = self.min_label_px / self.pixels_per_unit()
+        stack = list(mobjects)
+        while stack:
+            mob = stack.pop()
+            if isinstance(mob, TEXT_TYPES):
+                (hidden if mob.height < limit else glyphs).update(id(m) for m in mob.get_family())
+                continue
+            stack.extend(mob.submobjects)
+        return hidden, glyphs
+
+    def batch_key(self, mob, scale):
+        # Style key for shapes that can share one path, or None
+        if mob.get_stroke_width(True) > 0 or mob.get_sheen_factor() or mob.get_background_image() is not None:
+            return None
+        width = mob.get_stroke_width()
+        stroked = width > 0 and mob.stroke_rgbas[:, 3].any()
+        filled = mob.fill_rgbas[:, 3].any()
+        if filled and not stroked:
+            if len(mob.fill_rgbas) != 1 or mob.fill_rgbas[0, 3] < 1:
+                return None
+            return "fill", mob.fill_rgbas.tobytes()
+        if stroked and not filled:
+            if len(mob.stroke_rgbas) != 1:
+                return None
+            if mob.stroke_rgbas[0, 3] < 1 and width * self.cairo_line_width_multiple * scale > self.max_batched_stroke_px:
+                return None
+            return "stroke", mob.stroke_rgbas.tobytes(), width
+        return None
+
+    def level_of_detail(self, mobjects, glyphs=frozenset()):
+        shapes = [i for i, m in enumerate(mobjects) if isinstance(m, VMobject)]
+        if not shapes:
+            return mobjects
+        scale = self.pixels_per_unit()
+        points = [mobjects[i].points[:, :2] for i in shapes]
+        widths = [mobjects[i].get_stroke_width() for i in shapes]
+        starts = np.cumsum([0] + [len(p) for p in points[:-1]])
+        stacked = np.concatenate(points)
+        lo = np.minimum.reduceat(stacked, starts)
+        hi = np.maximum.reduceat(stacked, starts)
+
+        center = np.asarray(self.frame_center)[:2]
+        half = np.array([self.frame_width, self.frame_height]) / 2
+        # A stroke reaches half its width past the points
+        margin = max(widths) * self.cairo_line_width_multiple / 2
+        offscreen = ((hi < center - half - margin) | (lo > center + half + margin)).any(axis=1)
+        tiny = (hi - lo).max(axis=1) * scale < self.min_node_px
+
+        # Positions in mobjects that are replaced or skipped, and the proxies
+        # drawn at the position of the first member they replace
+        drop = {shapes[k] for k in np.flatnonzero(offscreen | tiny)}
+        proxies = {}
+
+        dots, dot_colors, first_dot = [], [], None
+        for k in np.flatnonzero(tiny & ~offscreen):
+            mob = mobjects[shapes[k]]
+            rgba = (mob.fill_rgbas if mob.fill_rgbas[:, 3].any() else mob.stroke_rgbas)[0]
+            # Point clouds overwrite pixels, so invisible shapes stay skipped
+            if rgba[3] > 0:
+                dots.append((lo[k] + hi[k]) / 2)
+                dot_colors.append(rgba)
+                first_dot = shapes[k] if first_dot is None else first_dot
+        if dots:
+            cloud = PMobject(stroke_width=1)
+            cloud.points = np.hstack([np.array(dots), np.zeros((len(dots), 1))])
+            cloud.rgbas = np.array(dot_colors)
+            proxies[first_dot] = cloud
+
+        # Runs of consecutive shapes sharing a style key, in draw order. Shapes
+        # that are skipped or drawn as dots don't split a run; anything else
+        # drawn in between does.
+        shape_at = {i: k for k, i in enumerate(shapes)}
+        runs, run, run_key = [], [], None
+        for i, mob in enumerate(mobjects):
+            k = shape_at.get(i)
+            if k is not None and (offscreen[k] or tiny[k]):
+                continue
+            key = None if k is None or id(mob) in glyphs else self.batch_key(mob, scale)
+            if key is None or key != run_key:
+                runs.append((run_key, run))
+                run = []
+            run_key = key
+            if key is not None:
+                run.append(i)
+        runs.append((run_key, run))
+        for key, members in runs:
+            # One-member runs gain nothing
+            if len(members) < 2:
+                continue
+            first = mobjects[members[0]]
+            proxy = VMobject(fill_opacity=0, stroke_width=0)
+            proxy.set_points(np.concatenate([mobjects[i].points for i in members]))
+            if key[0] == "fill":
+                proxy.fill_rgbas = first.fill_rgbas
+            else:
+                proxy.stroke_rgbas = first.stroke_rgbas
+                proxy.stroke_width = first.stroke_width
+            proxies[members[0]] = proxy
+            drop.update(members)
+
+        shown = []
+        for i, mob in enumerate(mobjects):
+            if i in proxies:
+                shown.append(proxies[i])
+            if i not in drop:
+                shown.append(mob)
+        return shown
+
+
+class LevelOfDetailSceneCamera(LevelOfDetailCamera, Camera):
+    pass
+
+
+class LevelOfDetailMovingCamera(LevelOfDetailCamera, MovingCamera):
+    pass
@@ -0,0 +1,210 @@
+from typing import NamedTuple, Tuple
+
+
+class AdRecord(NamedTuple):
+    title: str
+    text: str
+    phone: str
+    image_hashes: Tuple[str, ...] = ()
+    state: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        images = data.get("image_hashes") or data.get("images") or ()
+        if isinstance(images, str):
+            images = tuple(h for h in images.split("|") if h)
+        return cls(
+            title=data.get("title", ""),
+            text=data.get("text", ""),
+            phone=data.get("phone", ""),
+            image_hashes=tuple(images),
+            state=data.get("state", ""),
+        )
+
+
+class Component(NamedTuple):
+    root: int
+    ads: tuple
+
+    @property
+    def size(self):
+        return len(self.ads)
+
+
+class UnionFind:
+    # Disjoint-set over integer ids with union by size and path compression.
+    # Plain lists are used instead of numpy arrays: scalar indexing into a list
+    # is several times cheaper than into an ndarray from Python code.
+    def __init__(self):
+        self.parent = []
+        self.size = []
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self):
+        node = len(self.parent)
+        self.parent.append(node)
+        self.size.append(1)
+        return node
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        # Path compression: point every node on the walk straight at the root
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        return self.union_roots(self.find(a), self.find(b))
+
+    def union_roots(self, ra, rb):
+        # Returns (surviving root, absorbed root or None)
+        if ra == rb:
+            return ra, None
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra, rb
+
+
+class LinkageEngine:
+    # Builds the bipartite ad/attribute graph and keeps its connected components
+    # up to date as ads arrive. Ads and attributes share one id space in the
+    # union-find; attributes are interned by (kind, value). With
+    # keep_records=False only integer ids are kept per ad, for long streams
+    # whose records are re-read later by position. A text_index (see
+    # text_index.py) built over the same ads makes text link on near-duplicate
+    # clusters and drops over-shared text instead of linking on it.
+    def __init__(self, link_on=("phone", "image"), keep_records=True, text_index=None):
+        self.link_on = tuple(link_on)
+        self.keep_records = keep_records
+        self.text_index = text_index
+        self.uf = UnionFind()
+        self.records = []
+        self.ad_nodes = []
+        self.ad_attributes = []
+        self.attr_ids = {}
+        self.attr_keys = {}
+        # root -> ad indices in that component, merged small-into-large
+        self.members = {}
+
+    def __len__(self):
+        return len(self.ad_nodes)
+
+    def attribute_keys(self, record):
+        keys = []
+        if "phone" in self.link_on and record.phone:
+            keys.append(("phone", record.phone))
+        if "text" in self.link_on and record.text:
+            if self.text_index is None:
+                keys.append(("text", record.text))
+            else:
+                cluster = self.text_index.link_key(record.text)
+                if cluster is not None:
+                    keys.append(("text", cluster))
+        if "image" in self.link_on:
+            keys.extend(("image", h) for h in record.image_hashes if h)
+        return keys
+
+    def attribute_node(self, key):
+        node = self.attr_ids.get(key)
+        if node is None:
+            node = self.uf.add()
+            self.attr_ids[key] = node
+            self.attr_keys[node] = key
+        return node
+
+    def add_ad(self, record):
+        if isinstance(record, dict):
+            record = AdRecord.from_dict(record)
+        ad_index = len(self.ad_nodes)
+        ad_node = self.uf.add()
+        if self.keep_records:
+            self.records.append(record)
+        self.ad_nodes.append(ad_node)
+        self.members[ad_node] = [ad_index]
+
+        attrs = tuple(self.attribute_node(key) for key in self.attribute_keys(record))
+        self.ad_attributes.append(attrs)
+
+        # The new ad is always a root, so only the attribute side needs a find
+        root = ad_node
+        for attr in attrs:
+            root, absorbed = self.uf.union_roots(root, self.uf.find(attr))
+            if absorbed is not None:
+                self.merge_members(root, absorbed)
+        return root
+
+    def merge_members(self, root, absorbed):
+        moved = self.members.pop(absorbed, None)
+        if not moved:
+            return
+        kept = self.members.get(root)
+        if kept is None:
+            self.members[root] = moved
+        elif len(kept) < len(moved):
+            moved.extend(kept)
+            self.members[root] = moved
+        else:
+            kept.extend(moved)
+
+    def add_ads(self, records):
+        # Returns the roots of every component touched by this batch
+        touched = set()
+        for record in records:
+            touched.add(self.add_ad(record))
+        find = self.uf.find
+        return {find(root) for root in touched}
+
+    def iter_components(self, records, batch_size=1000, min_ads=2):
+        # Feed records in batches and yield each component that grew in the batch
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield from self.touched_components(self.add_ads(batch), min_ads)
+                batch = []
+        if batch:
+            yield from self.touched_components(self.add_ads(batch), min_ads)
+
+    def touched_components(self, roots, min_ads):
+        for root in roots:
+            if len(self.members.get(root, ())) >= min_ads:
+                yield self.component(root)
+
+    def component(self, root):
+        return Component(root, tuple(self.members.get(root, ())))
+
+    def component_attributes(self, component):
+        attrs = {attr for ad in component.ads for attr in self.ad_attributes[ad]}
+        return [self.attr_keys[attr] for attr in sorted(attrs)]
+
+    def component_of(self, ad_index):
+        return self.component(self.uf.find(self.ad_nodes[ad_index]))
+
+    def components(self, min_ads=1):
+        comps = [self.component(root) for root, ads in self.members.items() if len(ads) >= min_ads]
+        comps.sort(key=lambda c: -c.size)
+        return comps
+
+    def largest_component(self):
+        if not self.members:
+            return None
+        root = max(self.members, key=lambda r: len(self.members[r]))
+        return self.component(root)
+
+    def linking_pair(self, component):
+        # Find two ads in the component that share an attribute directly,
+        # together with the key of the shared attribute
+        first_seen = {}
+        for ad in component.ads:
+            for attr in self.ad_attributes[ad]:
+                other = first_seen.setdefault(attr, ad)
+                if other != ad:
+                    return other, ad, self.attr_keys[attr]
+        return None
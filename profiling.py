@@ -0,0 +1,167 @@
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class SceneProfiler:
+    # Opt-in instrumentation for a single scene render. attach() wraps the
+    # scene's play/wait, updaters, frame writes and the classes that do
+    # expensive construction (Text layout, SVG parsing, image decoding); steps
+    # declared with render_driver.step or mark_step become spans running from
+    # one boundary to the next. Nothing is wrapped unless a profiler is
+    # attached, so disabled cost is one dict lookup per step. save() writes a
+    # Chrome trace (chrome://tracing, Perfetto or speedscope for a flamegraph).
+    CONSTRUCTION_CLASSES = (("Text", "text"), ("SVGMobject", "svg"), ("ImageMobject", "image"))
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+        self.marks = []
+        self.patched = []
+        # Patched constructors currently running; Text.__init__ runs
+        # SVGMobject.__init__, which must not be booked a second time
+        self.construction_depth = 0
+        self.updater_time = 0.0
+        self.encode_time = 0.0
+        self.frames = 0
+
+    def now_us(self):
+        return (time.perf_counter() - self.start) * 1e6
+
+    @contextmanager
+    def span(self, name, category, **args):
+        begin = self.now_us()
+        try:
+            yield args
+        finally:
+            self.events.append({
+                "name": name, "cat": category, "ph": "X", "ts": begin, "dur": self.now_us() - begin,
+                "pid": os.getpid(), "tid": 0, "args": args,
+            })
+
+    def mark(self, name):
+        # Inline step boundary; spans run from one mark to the next
+        self.marks.append((name, self.now_us()))
+
+    def attach(self, scene):
+        scene.profiler = self
+        self.scene = scene
+
+        play = scene.play
+        update_mobjects = scene.update_mobjects
+        file_writer = scene.renderer.file_writer
+        write_frame = file_writer.write_frame
+
+        def profiled_play(*args, **kwargs):
+            name = ", ".join(type(a).__name__ for a in args) or "play"
+            updater_before, encode_before, frames_before = self.updater_time, self.encode_time, self.frames
+            with self.span(name, "play") as span_args:
+                result = play(*args, **kwargs)
+            span_args.update(
+                mobjects=sum(len(m.get_family()) for m in scene.mobjects),
+                frames=self.frames - frames_before,
+                updater_ms=1000 * (self.updater_time - updater_before),
+                encode_ms=1000 * (self.encode_time - encode_before),
+                skipped=bool(scene.renderer.skip_animations),
+            )
+            return result
+
+        def profiled_update_mobjects(dt):
+            t = time.perf_counter()
+            update_mobjects(dt)
+            self.updater_time += time.perf_counter() - t
+
+        def profiled_write_frame(*args, **kwargs):
+            t = time.perf_counter()
+            write_frame(*args, **kwargs)
+            self.encode_time += time.perf_counter() - t
+            self.frames += 1
+
+        # Scene.wait goes through self.play, so waits are captured as well
+        scene.play = profiled_play
+        scene.update_mobjects = profiled_update_mobjects
+        file_writer.write_frame = profiled_write_frame
+
+        import manim
+        for class_name, category in self.CONSTRUCTION_CLASSES:
+            self.patch_init(getattr(manim, class_name), category)
+        return self
+
+    def patch_init(self, cls, category):
+        original = cls.__dict__["__init__"]
+
+        @functools.wraps(original)
+        def profiled_init(mob, *args, **kwargs):
+            if self.construction_depth:
+                return original(mob, *args, **kwargs)
+            self.construction_depth += 1
+            try:
+                with self.span(cls.__name__, category):
+                    original(mob, *args, **kwargs)
+            finally:
+                self.construction_depth -= 1
+
+        cls.__init__ = profiled_init
+        self.patched.append((cls, original))
+
+    def detach(self):
+        for cls, original in reversed(self.patched):
+            cls.__init__ = original
+        self.patched = []
+
+    def step_events(self):
+        end = self.now_us()
+        events = []
+        for (name, begin), (_, stop) in zip(self.marks, self.marks[1:] + [(None, end)]):
+            events.append({"name": name, "cat": "step", "ph": "X", "ts": begin, "dur": stop - begin,
+                           "pid": os.getpid(), "tid": 0, "args": {}})
+        return events
+
+    def summary(self):
+        totals = {}
+        for event in self.events + self.step_events():
+            totals[event["cat"]] = totals.get(event["cat"], 0.0) + event["dur"] / 1000
+        totals["updaters"] = 1000 * self.updater_time
+        totals["encode"] = 1000 * self.encode_time
+        return {"total_ms": self.now_us() / 1000, "frames": self.frames, "category_ms": totals}
+
+    def save(self, path):
+        trace = {"traceEvents": sorted(self.events + self.step_events(), key=lambda e: e["ts"]),
+                 "displayTimeUnit": "ms", "otherData": self.summary()}
+        with open(path, "w") as f:
+            json.dump(trace, f)
+        return path
+
+
+def profile_scene(scene_cls, trace_path, **scene_kwargs):
+    # Render one scene with the profiler attached and write its trace
+    profiler = SceneProfiler()
+    scene = scene_cls(**scene_kwargs)
+    profiler.attach(scene)
+    try:
+        scene.render()
+    finally:
+        profiler.detach()
+    profiler.save(trace_path)
+    return profiler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a scene with profiling and write a Chrome trace")
+    parser.add_argument("module", help="scene module, e.g. ad_linkage")
+    parser.add_argument("scene", help="scene class, e.g. AdLinkingVisualization")
+    parser.add_argument("-o", "--output", default=None, help="trace file (default <scene>.trace.json)")
+    parser.add_argument("-q", "--quality", default="low_quality")
+    args = parser.parse_args()
+
+    from manim import tempconfig
+
+    sys.path.insert(0, os.getcwd())
+    scene_cls = getattr(__import__(args.module), args.scene)
+    with tempconfig({"quality": args.quality}):
+        profiler = profile_scene(scene_cls, args.output or f"{args.scene}.trace.json")
+    print(json.dumps(profiler.summary(), indent=2))
@@ -0,0 +1,369 @@
+import argparse
+import functools
+import hashlib
+import inspect
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def mark_step(scene, name, source=None):
+    # Record a section boundary at the scene's current play count. Every
+    # self.play and self.wait counts as one play. While the driver is recording
+    # (the dry run), the boundary also carries a digest of the code that draws
+    # the section: the step method, or construct for inline marks, and the
+    # helpers it uses (see code_digest).
+    digest = None
+    if scene.__dict__.get("recording_states"):
+        digest = code_digest(source or type(scene).construct, type(scene))
+    scene.__dict__.setdefault("step_boundaries", []).append((name, scene.renderer.num_plays, digest))
+    profiler = scene.__dict__.get("profiler")
+    if profiler is not None:
+        profiler.mark(name)
+
+
+def step(method):
+    # Decorator for scene step methods: each call starts a new section
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        mark_step(self, method.__name__, method)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+    return names
+
+
+def module_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def code_digest(function, scene_cls):
+    # Digest of a step: its own source, the source of the scene methods and
+    # same-module functions and classes it refers to (followed recursively),
+    # and the whole file of every other repo module it uses, such as labels,
+    # components or layout. Other steps and unrelated modules don't count, so
+    # editing one step leaves the keys of the other sections alone.
+    scene_module = sys.modules[scene_cls.__module__]
+    parts, seen, pending = {}, set(), [inspect.unwrap(function)]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        module = inspect.getmodule(obj)
+        path = getattr(module, "__file__", None)
+        if path is None or os.path.dirname(os.path.abspath(path)) != ROOT:
+            continue
+        if module is not scene_module:
+            parts[path] = module_digest(path)
+            continue
+        parts[f"{obj.__module__}.{obj.__qualname__}"] = inspect.getsource(obj)
+        if not isinstance(obj, types.FunctionType):
+            continue
+        for name in code_names(obj.__code__):
+            for found in (getattr(scene_cls, name, None), obj.__globals__.get(name)):
+                if isinstance(found, (types.FunctionType, type)):
+                    pending.append(inspect.unwrap(found))
+                elif isinstance(found, types.ModuleType):
+                    pending.append(found)
+    return hashlib.sha1(repr(sorted(parts.items())).encode()).hexdigest()
+
+
+def play_timing(scene):
+    # Timing of the play just made: run time, lag ratio and a sample of the
+    # rate function of every animation in it. Two plays between the same
+    # states can still differ in these.
+    def describe(animation):
+        rate = [round(float(animation.rate_func(t)), 6) for t in np.linspace(0, 1, 9)]
+        return (type(animation).__name__, round(float(animation.run_time), 6),
+                round(float(getattr(animation, "lag_ratio", 0)), 6), rate,
+                [describe(a) for a in getattr(animation, "animations", ())])
+
+    return repr([describe(a) for a in getattr(scene, "animations", None) or ()])
+
+
+def state_fingerprint(scene):
+    # Digest of everything that ends up in a frame: mobject types, points,
+    # colors and image pixels of every mobject on screen
+    h = hashlib.sha1()
+    for mob in scene.mobjects:
+        for sub in mob.get_family():
+            h.update(type(sub).__name__.encode())
+            for attr in ("points", "fill_rgbas", "stroke_rgbas", "rgbas", "pixel_array"):
+                value = getattr(sub, attr, None)
+                if isinstance(value, np.ndarray):
+                    h.update(np.round(value.astype(np.float64), 5).tobytes())
+            h.update(repr(getattr(sub, "stroke_width", None)).encode())
+    return h.hexdigest()
+
+
+def hold_static_frames(scene):
+    # Manim rasterizes a static wait (a lone Wait with no time-based updaters)
+    # once, but still pipes and encodes every frame of it. With this installed,
+    # such a wait sends its frame to ffmpeg once and ffmpeg's tpad filter
+    # clones it for the rest of the hold, so the partial movie keeps its codec
+    # settings and frame count and concatenates as before. Only the Cairo
+    # renderer's mp4 pipe is handled; other outputs render unchanged.
+    from manim import RendererType, __version__, config
+
+    # The pipe below is SceneFileWriter.open_movie_pipe of manim 0.18. Later
+    # versions encode in-process through PyAV and have no pipe to replace, so
+    # any other version renders the stock way.
+    if tuple(__version__.split(".")[:2]) != ("0", "18"):
+        return scene
+
+    renderer = scene.renderer
+    writer = renderer.file_writer
+    open_movie_pipe = writer.open_movie_pipe
+    freeze_current_frame = renderer.freeze_current_frame
+
+    def held_frames():
+        return int(scene.duration / (1 / config.frame_rate))
+
+    def open_pipe(file_path=None):
+        writer.holding = False
+        if (config.renderer != RendererType.CAIRO or config.transparent or config.movie_file_extension != ".mp4"
+                or not scene.is_current_animation_frozen_frame() or held_frames() < 2):
+            return open_movie_pipe(file_path)
+        if file_path is None:
+            file_path = writer.partial_movie_files[renderer.num_plays]
+        writer.partial_movie_file_path = file_path
+        fps = int(config.frame_rate) if config.frame_rate == int(config.frame_rate) else config.frame_rate
+        # Same command as SceneFileWriter.open_movie_pipe, plus the tpad filter
+        command = [
+            config.ffmpeg_executable, "-y", "-f", "rawvideo", "-s", f"{config.pixel_width}x{config.pixel_height}",
+            "-pix_fmt", "rgba", "-r", str(fps), "-i", "-", "-an", "-loglevel", config.ffmpeg_loglevel.lower(),
+            "-metadata", f"comment=Rendered with Manim Community v{__version__}",
+            "-vf", f"tpad=stop_mode=clone:stop={held_frames() - 1}",
+            "-vcodec", "libx264", "-pix_fmt", "yuv420p", str(file_path),
+        ]
+        writer.writing_process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        writer.holding = True
+
+    def freeze(duration):
+        if renderer.skip_animations or not writer.__dict__.get("holding"):
+            return freeze_current_frame(duration)
+        frames = int(duration / (1 / renderer.camera.frame_rate))
+        renderer.add_frame(renderer.get_frame())
+        renderer.time += (frames - 1) / renderer.camera.frame_rate
+
+    writer.open_movie_pipe = open_pipe
+    renderer.freeze_current_frame = freeze
+    return scene
+
+
+def seed_everything(seed):
+    # Sections are rendered by replaying construct in separate processes, so
+    # every process must draw the same random numbers
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def plan_sections(total_plays, boundaries, max_plays=None):
+    # Turn (name, first play) boundaries into (name, start, end) play ranges,
+    # optionally splitting long sections so work spreads over more processes.
+    # A step without any plays shares its start with the next one; the later name wins.
+    names = {start: name for name, start, *_ in boundaries if 0 <= start < total_plays}
+    names.setdefault(0, "start")
+    starts = sorted(names)
+    sections = []
+    for start, end in zip(starts, starts[1:] + [total_plays]):
+        name = names[start]
+        if end <= start:
+            continue
+        chunk = max_plays or end - start
+        for i, lo in enumerate(range(start, end, chunk)):
+            sections.append((name if i == 0 else f"{name}_{i}", lo, min(lo + chunk, end)))
+    return sections
+
+
+def count_plays(scene_cls, scene_kwargs, seed):
+    # Run construct without rendering anything to find the step boundaries,
+    # the scene state going into every play (states[i] is the state before play
+    # i, states[-1] the final state) and the timing of every play
+    from manim import tempconfig
+
+    with tempconfig({"dry_run": True, "skip_animations": True, "disable_caching": True}):
+        seed_everything(seed)
+        scene = scene_cls(**scene_kwargs)
+        scene.recording_states = True
+        states = []
+        timings = []
+        play = scene.play
+
+        def recording_play(*args, **kwargs):
+            states.append(state_fingerprint(scene))
+            result = play(*args, **kwargs)
+            timings.append(play_timing(scene))
+            return result
+
+        # Scene.wait goes through self.play, so this sees every play
+        scene.play = recording_play
+        scene.render()
+        states.append(state_fingerprint(scene))
+        return scene.renderer.num_plays, list(getattr(scene, "step_boundaries", [])), states, timings
+
+
+def section_key(scene_cls, scene_kwargs, seed, overrides, boundaries, states, timings, start, end):
+    # Content address of a rendered section: the code drawing it, the state
+    # going in and coming out, the timing of its plays and everything else
+    # that affects its pixels
+    source = None
+    for _, boundary_start, digest in boundaries:
+        if boundary_start <= start:
+            source = digest
+    if source is None:
+        source = code_digest(scene_cls.construct, scene_cls)
+    parts = (
+        scene_cls.__module__, scene_cls.__qualname__, repr(sorted(scene_kwargs.items())), seed,
+        repr(sorted(overrides.items())), source, states[start], states[end], timings[start:end],
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def render_section(scene_cls, scene_kwargs, index, start, end, seed, overrides, job=0):
+    # Replay construct with every play before start skipped, which rebuilds the
+    # exact mobject state at the boundary, then render plays start..end-1 only.
+    # File names carry the job index, so the same class rendered with
+    # different kwargs in one batch never shares section files.
+    from manim import tempconfig
+
+    name = f"{scene_cls.__name__}_{job}"
+    section_config = dict(overrides)
+    section_config.update({
+        "from_animation_number": start,
+        "upto_animation_number": end - 1,
+        "output_file": f"{name}_section_{index:03d}",
+        # Separate partial movie directories keep concurrent sections from
+        # sharing the same partial_movie_file_list.txt
+        "partial_movie_dir": f"{{video_dir}}/partial_movie_files/{name}/section_{index:03d}",
+    })
+    with tempconfig(section_config):
+        seed_everything(seed)
+        scene = hold_static_frames(scene_cls(**scene_kwargs))
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def concat_movies(paths, output):
+    # Lossless concatenation: every section shares codec and resolution, so
+    # ffmpeg's concat demuxer can copy the streams without re-encoding
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is required to concatenate section movies")
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+        list_path = f.name
+    try:
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output],
+            check=True,
+        )
+    finally:
+        os.remove(list_path)
+    return output
+
+
+def normalize_jobs(scenes):
+    return [(job, {}) if isinstance(job, type) else (job[0], dict(job[1])) for job in scenes]
+
+
+def render_parallel(scenes, workers=None, seed=0, max_plays=None, overrides=None, output=None, cache_dir=None):
+    # Render each scene as independent sections over a process pool and stitch
+    # the sections back together. scenes holds scene classes or
+    # (scene class, kwargs) pairs; overrides are manim config values such as
+    # {"quality": "low_quality"}. Returns the movie path of every scene, plus
+    # the combined explainer when output is given.
+    #
+    # With cache_dir, every rendered section is stored under its section_key
+    # and reused while its code and incoming/outgoing state are unchanged, so
+    # only edited steps and steps whose state they changed are re-rendered.
+    jobs = normalize_jobs(scenes)
+    overrides = dict(overrides or {})
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(count_plays, *zip(*[(cls, kwargs, seed) for cls, kwargs in jobs])))
+
+        futures = []
+        for job, ((cls, kwargs), (total, boundaries, states, timings)) in enumerate(zip(jobs, counts)):
+            scene_parts = []
+            for i, (_, start, end) in enumerate(plan_sections(total, boundaries, max_plays)):
+                cached = None
+                if cache_dir:
+                    key = section_key(cls, kwargs, seed, overrides, boundaries, states, timings, start, end)
+                    cached = os.path.join(cache_dir, key + ".mp4")
+                if cached and os.path.exists(cached):
+                    scene_parts.append((None, cached))
+                else:
+                    scene_parts.append((pool.submit(render_section, cls, kwargs, i, start, end, seed, overrides, job), cached))
+            futures.append(scene_parts)
+
+        movies = []
+        for job, ((cls, _), scene_parts) in enumerate(zip(jobs, futures)):
+            parts = []
+            movie_dir = os.path.dirname(os.path.abspath(output)) if output else os.getcwd()
+            for future, cached in scene_parts:
+                if future is None:
+                    parts.append(cached)
+                    continue
+                path = future.result()
+                if cached:
+                    # Moved into place so concurrent runs never see a partial copy
+                    shutil.copyfile(path, f"{cached}.{os.getpid()}.tmp")
+                    os.replace(f"{cached}.{os.getpid()}.tmp", cached)
+                parts.append(path)
+                movie_dir = os.path.dirname(path)
+            if not parts:
+                continue
+            movie = os.path.join(movie_dir, f"{cls.__name__}_{job}.mp4")
+            movies.append(concat_movies(parts, movie))
+
+    if output:
+        movies.append(concat_movies(movies, output))
+    return movies
+
+
+if __name__ == "__main__":
+    from ad_linkage import AdLinkingVisualization
+    from giant_component import GiantComponentScene
+    from us_map_scene import HighlightMapScene
+
+    parser = argparse.ArgumentParser(description="Render the explainer scenes in parallel sections")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("-q", "--quality", default="high_quality",
+                        help="manim quality name, e.g. low_quality or production_quality")
+    parser.add_argument("--max-plays", type=int, default=None, help="split steps longer than this many plays")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="explainer.mp4")
+    parser.add_argument("--cache-dir", default=os.path.join("media", "section_cache"),
+                        help="reuse unchanged sections from here; pass an empty string to disable")
+    args = parser.parse_args()
+
+    for path in render_parallel(
+        [AdLinkingVisualization, GiantComponentScene, HighlightMapScene],
+        workers=args.workers,
+        seed=args.seed,
+        max_plays=args.max_plays,
+        overrides={"quality": args.quality},
+        output=args.output,
+        cache_dir=args.cache_dir,
+    ):
+        print(path)
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple
+
+from render_driver import hold_static_frames, seed_everything
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class Job(NamedTuple):
+    name: str
+    scene: str
+    params: dict
+    config: dict
+    seed: int = 0
+
+
+def load_manifest(path, defaults=None):
+    # A JSON list or JSONL file of {"scene": "module.Class", "params": {...},
+    # "config": {...}, "name": ..., "seed": ...}; only scene is required.
+    # defaults are manim config values for jobs that don't set them.
+    with open(path) as f:
+        text = f.read()
+    entries = json.loads(text) if text.lstrip().startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+    jobs = []
+    names = set()
+    for i, entry in enumerate(entries):
+        name = entry.get("name") or f"{entry['scene'].rpartition('.')[2]}_{i:03d}"
+        if name in names:
+            raise ValueError(f"Duplicate job name {name!r} in {path}")
+        names.add(name)
+        config = {**(defaults or {}), **entry.get("config", {})}
+        jobs.append(Job(name, entry["scene"], entry.get("params", {}), config, entry.get("seed", 0)))
+    return jobs
+
+
+def scene_class(spec):
+    module, _, name = spec.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def resolve_params(params):
+    # Params are JSON, so datasets are referenced rather than inlined:
+    # {"ads": {"export": path, "size": n}} links the export and passes the
+    # records of the first component reaching n ads
+    params = dict(params)
+    ads = params.get("ads")
+    if isinstance(ads, dict):
+        from ad_stream import DEFAULT_WINDOW, first_component_ads
+
+        params["ads"] = first_component_ads(ads["export"], ads.get("size", 50), ads.get("format"),
+                                            ads.get("start", 0), ads.get("limit", DEFAULT_WINDOW),
+                                            ads.get("near_duplicates", False))
+    return params
+
+
+def warm_worker(modules):
+    # Runs once in every worker process. Workers live for the whole batch, so
+    # what is loaded here and everything the scenes cache per process (state
+    # outlines, Text labels, node prototypes, decoded images) stays warm from
+    # one job to the next. The working directory is left alone, so media and
+    # manifest paths mean what they did where the farm was started; scene
+    # assets resolve against the img/ directory next to this file.
+    sys.path.insert(0, ROOT)
+    for module in modules:
+        importlib.import_module(module)
+    if "us_map_scene" in modules:
+        from us_map_cache import load_cache_data
+
+        load_cache_data("us_states.svg")
+
+
+def run_job(job, started_path=None):
+    from manim import tempconfig
+
+    # Tells the farm this job got to a worker, should the worker die
+    if started_path:
+        open(started_path, "w").close()
+    start = time.perf_counter()
+    cls = scene_class(job.scene)
+    # Variants of one scene share its scene_name, so partial movies get a
+    # directory per job or concurrent jobs would overwrite each other's
+    config = {**job.config, "output_file": job.name,
+              "partial_movie_dir": f"{{video_dir}}/partial_movie_files/{job.name}"}
+    with tempconfig(config):
+        seed_everything(job.seed)
+        scene = hold_static_frames(cls(**resolve_params(job.params)))
+        scene.render()
+        movie = str(scene.renderer.file_writer.movie_file_path)
+    return {"name": job.name, "movie": movie, "seconds": time.perf_counter() - start, "worker": os.getpid()}
+
+
+def run_farm(jobs, workers=None, retries=2, log=print):
+    # Render every job over a pool of long-lived worker processes, retrying
+    # failed jobs up to retries times. A crashed worker breaks the whole pool,
+    # which is then recreated with the same warm-up.
+    # Returns (results, failures) in completion order.
+    workers = workers or os.cpu_count()
+    modules = sorted({job.scene.rpartition(".")[0] for job in jobs})
+    if "us_map_scene" in modules:
+        # Build the state cache once here rather than racing in every worker
+        from us_map_cache import load_cache_data
+
+        load_cache_data("us_states.svg")
+    # One process per job already uses every core; keep NumPy's BLAS from
+    # starting a thread per core inside each of them
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+
+    ctx = multiprocessing.get_context("spawn")
+    attempts = {job.name: 0 for job in jobs}
+    pending = list(jobs)
+    results, failures = [], []
+    total = len(jobs)
+
+    def retry_or_fail(job, error):
+        attempts[job.name] += 1
+        if attempts[job.name] <= retries:
+            log(f"[{len(results) + len(failures)}/{total}] {job.name} failed, retry {attempts[job.name]}/{retries}: {error.splitlines()[-1]}")
+            pending.append(job)
+        else:
+            failures.append({"name": job.name, "attempts": attempts[job.name], "error": error})
+            log(f"[{len(results) + len(failures)}/{total}] {job.name} FAILED after {attempts[job.name]} attempts")
+
+    # At most one job per worker is in flight, and each job leaves a marker
+    # file once a worker picks it up. When a worker dies, jobs that never
+    # started go back to pending; of those that did, a lone one is the
+    # culprit, otherwise they become suspects and run one at a time, so a
+    # crash only costs an attempt to the job that caused it. If none had
+    # started, every in-flight job is charged an attempt.
+    suspects = []
+    with tempfile.TemporaryDirectory() as started_dir:
+        def started_path(job):
+            return os.path.join(started_dir, hashlib.sha1(job.name.encode()).hexdigest())
+
+        while pending or suspects:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=warm_worker,
+                                     initargs=(modules,)) as pool:
+                active = {}
+                broken = False
+                while active or ((pending or suspects) and not broken):
+                    while not broken and len(active) < workers and ((suspects and not active)
+                                                                    or (pending and not suspects)):
+                        queue = suspects if suspects else pending
+                        job = queue.pop(0)
+                        if os.path.exists(started_path(job)):
+                            os.remove(started_path(job))
+                        try:
+                            active[pool.submit(run_job, job, started_path(job))] = job
+                        except BrokenProcessPool:
+                            queue.insert(0, job)
+                            broken = True
+                    in_flight = list(active.values())
+                    done, _ = wait(active, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = active.pop(future)
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            broken = True
+                            running = sum(os.path.exists(started_path(j)) for j in in_flight)
+                            if not running:
+                                # Workers die before running anything (e.g. a
+                                # failing warm-up): charge every job so the
+                                # batch still ends
+                                retry_or_fail(job, "worker process died before starting the job")
+                            elif not os.path.exists(started_path(job)):
+                                pending.insert(0, job)
+                            elif running == 1:
+                                retry_or_fail(job, "worker process died")
+                            else:
+                                suspects.append(job)
+                        except Exception:
+                            retry_or_fail(job, traceback.format_exc())
+                        else:
+                            results.append(result)
+                            log(f"[{len(results) + len(failures)}/{total}] {job.name} done in {result['seconds']:.1f}s")
+    return results, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a manifest of scene variants over a process pool")
+    parser.add_argument("manifest", help="JSON list or JSONL of {scene, params, config, name, seed} jobs")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("-q", "--quality", default="high_quality", help="manim quality for jobs that don't set one")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("-o", "--report", default="render_farm_report.json")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest, {"quality": args.quality})
+    start = time.perf_counter()
+    results, failures = run_farm(jobs, args.workers, args.retries)
+    wall = time.perf_counter() - start
+    busy = sum(r["seconds"] for r in results)
+    print(f"{len(results)}/{len(jobs)} jobs in {wall:.1f}s on {args.workers} workers "
+          f"({busy / max(wall, 1e-9):.1f}x parallel speedup)")
+    with open(args.report, "w") as f:
+        json.dump({"workers": args.workers, "wall_s": wall, "results": results, "failures": failures}, f, indent=2)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from linkage import UnionFind
+
+WORDS = re.compile(r"[a-z0-9]+")
+# Mersenne prime for the universal hashes; shingle hashes are 32-bit, so
+# a * x fits in 64 bits before the reduction
+PRIME = np.uint64((1 << 61) - 1)
+
+
+def normalize_text(text):
+    return " ".join(WORDS.findall((text or "").lower()))
+
+
+def shingles(text, k=3):
+    # crc32 of every k-word window; texts shorter than k words are one shingle
+    words = text.split()
+    grams = [" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))]
+    return np.array([zlib.crc32(g.encode()) for g in grams], dtype=np.uint64)
+
+
+class TextIndex:
+    # Near-duplicate ad text through MinHash signatures and banded LSH, built in
+    # one streaming pass. Memory grows with the number of distinct texts, not
+    # ads: exact repeats (the bulk of generic text) are recognised by digest
+    # before any hashing, and each distinct text keeps a union-find node and
+    # one bucket entry per band. Texts whose signatures agree on all rows of
+    # any band land in the same cluster; with the defaults that catches pairs
+    # above about 0.7 shingle Jaccard similarity. Cluster samples are cut to
+    # sample_chars, so long ad bodies are not kept.
+    def __init__(self, num_perm=64, bands=8, shingle=3, max_phones=5, sample_chars=120, seed=0):
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        # A cluster posted under this many distinct phones is over-shared
+        self.max_phones = max_phones
+        self.sample_chars = sample_chars
+        self.uf = UnionFind()
+        self.digests = {}
+        self.buckets = [{} for _ in range(bands)]
+        # Per union-find root: ads seen, distinct phones (capped at
+        # max_phones) and one sample text
+        self.ads = []
+        self.phones = []
+        self.samples = []
+
+    def __len__(self):
+        return len(self.uf)
+
+    def signature(self, text):
+        x = shingles(text, self.shingle)
+        return ((self.a[:, None] * x[None, :] % PRIME + self.b[:, None]) % PRIME).min(axis=1)
+
+    def digest(self, text):
+        return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+    def add(self, text, phone=""):
+        # Returns the cluster (union-find root) of text, or None for empty text
+        text = normalize_text(text)
+        if not text:
+            return None
+        key = self.digest(text)
+        node = self.digests.get(key)
+        if node is None:
+            node = self.digests[key] = self.uf.add()
+            self.ads.append(0)
+            self.phones.append(set())
+            self.samples.append(text[:self.sample_chars])
+            signature = self.signature(text)
+            for band, buckets in enumerate(self.buckets):
+                bucket = hash(signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                other = buckets.setdefault(bucket, node)
+                if other != node:
+                    self.union(node, other)
+        root = self.uf.find(node)
+        self.ads[root] += 1
+        if phone and len(self.phones[root]) < self.max_phones:
+            self.phones[root].add(phone)
+        return root
+
+    def union(self, a, b):
+        root, absorbed = self.uf.union(a, b)
+        if absorbed is not None:
+            self.ads[root] += self.ads[absorbed]
+            phones = self.phones[root]
+            phones.update(list(self.phones[absorbed])[:self.max_phones - len(phones)])
+            self.phones[absorbed] = set()
+            self.samples[absorbed] = None
+
+    def add_ads(self, ads):
+        for ad in ads:
+            self.add(ad.text, ad.phone)
+        return self
+
+    def cluster(self, text):
+        # Cluster of a text already added, or None
+        node = self.digests.get(self.digest(normalize_text(text)))
+        return None if node is None else self.uf.find(node)
+
+    def is_low_trust(self, cluster):
+        return len(self.phones[cluster]) >= self.max_phones
+
+    def low_trust_cluster(self, text):
+        cluster = self.cluster(text)
+        return cluster if cluster is not None and self.is_low_trust(cluster) else None
+
+    def link_key(self, text):
+        # What LinkageEngine links text on: the near-duplicate cluster, or None
+        # when the text is unknown or over-shared and must not become an edge
+        cluster = self.cluster(text)
+        return None if cluster is None or self.is_low_trust(cluster) else cluster
+
+    def clusters(self, min_ads=2):
+        # (cluster, ads, sample text) for every cluster of at least min_ads,
+        # most ads first
+        found = [(root, self.ads[root], self.samples[root])
+                 for root in range(len(self.uf)) if self.uf.parent[root] == root and self.ads[root] >= min_ads]
+        found.sort(key=lambda c: -c[1])
+        return found
+
+
+def build_text_index(ads, **kwargs):
+    return TextIndex(**kwargs).add_ads(ads)
+
+
+def generic_text_links(path, num_clusters, fmt=None, limit=None, **kwargs):
+    # Pairs (i, j) of the num_clusters largest people in a crawl export, linked
+    # on phone and image only, that post the same over-shared text: the false
+    # cross-links linking on text would add. Two streaming passes. The second
+    # needs no node per ad: each ad unions its phone and images directly and
+    # is counted at their root, and low-trust text is kept once per (text
+    # cluster, attribute). Memory grows with distinct texts and attributes,
+    # not with ads; ads with neither phone nor image belong to no one.
+    from ad_stream import stream_ads, window
+
+    index = build_text_index(window(stream_ads(path, fmt), 0, limit), **kwargs)
+    uf = UnionFind()
+    nodes = {}
+    ads = []
+    shared = set()
+    for ad in window(stream_ads(path, fmt), 0, limit):
+        keys = [("phone", ad.phone)] if ad.phone else []
+        keys.extend(("image", h) for h in ad.image_hashes if h)
+        first = None
+        for key in keys:
+            node = nodes.get(key)
+            if node is None:
+                node = nodes[key] = uf.add()
+                ads.append(0)
+            if first is None:
+                first = node
+                continue
+            root, absorbed = uf.union(first, node)
+            if absorbed is not None:
+                ads[root] += ads[absorbed]
+        if first is None:
+            continue
+        ads[uf.find(first)] += 1
+        cluster = index.low_trust_cluster(ad.text)
+        if cluster is not None:
+            shared.add((cluster, first))
+
+    roots = [node for node in range(len(uf)) if uf.parent[node] == node]
+    roots.sort(key=lambda root: -ads[root])
+    rank = {root: k for k, root in enumerate(roots[:num_clusters])}
+    by_text = {}
+    for cluster, node in shared:
+        k = rank.get(uf.find(node))
+        if k is not None:
+            by_text.setdefault(cluster, set()).add(k)
+    # One chain per text rather than every pair, as a single edge per person
+    # to the shared text node would merge them
+    pairs = set()
+    for ranks in by_text.values():
+        ranks = sorted(ranks)
+        pairs.update(zip(ranks, ranks[1:]))
+    return sorted(pairs)
+
+
+def cached_generic_text_links(path, num_clusters, fmt=None, limit=None, **kwargs):
+    # generic_text_links saved as JSON next to the export, keyed on its size,
+    # mtime and the parameters, so the two passes run once rather than in
+    # every scene (and every section process) built from the export
+    stat = os.stat(path)
+    params = hashlib.blake2b(repr((num_clusters, fmt, limit, sorted(kwargs.items()))).encode(),
+                             digest_size=6).hexdigest()
+    cache_path = f"{path}.text_links_{params}_{stat.st_size:x}_{stat.st_mtime_ns:x}.json"
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return [tuple(pair) for pair in json.load(f)]
+    pairs = generic_text_links(path, num_clusters, fmt, limit, **kwargs)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(pairs, f)
+    os.replace(tmp_path, cache_path)
+    return pairs
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from ad_stream import stream_ads, window
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate and over-shared ad text in a crawl export")
+    parser.add_argument("path", help="JSONL or CSV export, optionally gzipped")
+    parser.add_argument("--limit", type=int, default=None, help="only read this many ads")
+    parser.add_argument("--max-phones", type=int, default=5, help="distinct phones that make a text over-shared")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--links", type=int, default=None, metavar="N",
+                        help="also cache the text cross-links of the N largest people for GiantComponentScene")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_text_index(window(stream_ads(args.path), 0, args.limit), max_phones=args.max_phones)
+    clusters = index.clusters()
+    low_trust = [c for c in clusters if index.is_low_trust(c[0])]
+    print(f"{len(index)} distinct texts, {len(clusters)} near-duplicate clusters, "
+          f"{len(low_trust)} low-trust in {time.perf_counter() - start:.1f}s")
+    for cluster, ads, sample in low_trust[:args.top]:
+        print(f"{ads:8d} ads  {sample[:80]!r}")
+    if args.links:
+        pairs = cached_generic_text_links(args.path, args.links, limit=args.limit, max_phones=args.max_phones)
+        print(f"{len(pairs)} text cross-links between the {args.links} largest people")
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import sys
+import xml.etree.ElementTree as ET
+from typing import NamedTuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+from scipy.spatial import cKDTree
+
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img")
+CACHE_VERSION = 2
+# States whose outlines come within this fraction of the map width share a border
+ADJACENCY_TOLERANCE = 0.003
+
+
+class StateIndex(NamedTuple):
+    # Geometry precomputed from the SVG outlines, in the cache's coordinates.
+    # Distances are in map widths so they don't depend on how the map is scaled.
+    ids: list
+    centroids: np.ndarray
+    neighbors: dict
+    distances: np.ndarray
+    hops: np.ndarray
+    nearest: np.ndarray
+    bounds: np.ndarray
+
+
+def resolve_svg_path(svg_path):
+    # Accept bare file names like "us_states.svg" and look them up under img/
+    if os.path.exists(svg_path):
+        return svg_path
+    candidate = os.path.join(IMG_DIR, svg_path)
+    if os.path.exists(candidate):
+        return candidate
+    raise FileNotFoundError(svg_path)
+
+
+def default_cache_path(svg_path):
+    root, _ = os.path.splitext(svg_path)
+    return root + ".states.npz"
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def read_state_ids(svg_path):
+    # Every <path> with an id is a state; data-name carries the full name
+    ids, names = [], []
+    for elem in ET.parse(svg_path).iter():
+        if elem.tag.rsplit("}", 1)[-1] == "path" and elem.get("id"):
+            ids.append(elem.get("id"))
+            names.append(elem.get("data-name", elem.get("id")))
+    return ids, names
+
+
+def outlines(points):
+    # Split VMobject points (four per cubic) into outlines of curve anchors,
+    # starting a new outline wherever a curve doesn't continue the previous one
+    curves = points.reshape(-1, 4, points.shape[-1])
+    breaks = np.flatnonzero(np.abs(curves[1:, 0] - curves[:-1, 3]).max(axis=1) > 1e-6) + 1
+    return [np.vstack([c[:, 0], c[-1:, 3]])[:, :2] for c in np.split(curves, breaks)]
+
+
+def state_centroid(points):
+    # Area-weighted centroid over every outline, so islands barely move it
+    total, weighted = 0.0, np.zeros(2)
+    for poly in outlines(points):
+        x, y = poly[:, 0], poly[:, 1]
+        x1, y1 = np.roll(x, -1), np.roll(y, -1)
+        cross = x * y1 - x1 * y
+        area = cross.sum() / 2
+        if abs(area) < 1e-12:
+            continue
+        center = np.array([((x + x1) * cross).sum(), ((y + y1) * cross).sum()]) / (6 * area)
+        total += abs(area)
+        weighted += abs(area) * center
+    return weighted / total if total else points[:, :2].mean(axis=0)
+
+
+def border_samples(points, spacing):
+    # Points along every outline segment, at most spacing apart
+    samples = []
+    for poly in outlines(points):
+        starts, ends = poly[:-1], poly[1:]
+        counts = np.maximum(np.ceil(np.linalg.norm(ends - starts, axis=1) / spacing), 1).astype(int)
+        t = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = t / np.repeat(counts, counts)
+        samples.append(np.repeat(starts, counts, axis=0) + t[:, None] * np.repeat(ends - starts, counts, axis=0))
+    return np.vstack(samples)
+
+
+def state_geometry(chunks):
+    # Centroids, border adjacency (CSR), centroid distances, hop counts and
+    # nearest-first order for every state, computed once at build time
+    lo = np.min([c[:, :2].min(axis=0) for c in chunks], axis=0)
+    hi = np.max([c[:, :2].max(axis=0) for c in chunks], axis=0)
+    width = hi[0] - lo[0]
+    tolerance = ADJACENCY_TOLERANCE * width
+    n = len(chunks)
+
+    centroids = np.array([state_centroid(c) for c in chunks])
+    samples = [border_samples(c, tolerance) for c in chunks]
+    owner = np.repeat(np.arange(n), [len(s) for s in samples])
+    pairs = cKDTree(np.vstack(samples)).query_pairs(tolerance, output_type="ndarray")
+    pairs = owner[pairs]
+    pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+
+    adjacency = csr_matrix((np.ones(2 * len(pairs)), (np.r_[pairs[:, 0], pairs[:, 1]], np.r_[pairs[:, 1], pairs[:, 0]])),
+                           shape=(n, n))
+    hops = shortest_path(adjacency, unweighted=True, directed=False)
+    hops[np.isinf(hops)] = -1
+    distances = np.linalg.norm(centroids[:, None] - centroids[None], axis=2) / width
+    return {
+        "centroids": centroids,
+        "adj_offsets": adjacency.indptr,
+        "adj_indices": adjacency.indices,
+        "distances": distances.astype(np.float32),
+        "hops": hops.astype(np.int16),
+        "nearest": np.argsort(distances, axis=1, kind="stable")[:, 1:].astype(np.int16),
+        "bounds": np.array([lo, hi]),
+    }
+
+
+def build_state_cache(svg_path, cache_path=None):
+    # Parse the SVG once with manim and store each state's bezier points, keyed
+    # by SVG element id, as one concatenated array plus offsets
+    from manim import SVGMobject
+
+    svg_path = resolve_svg_path(svg_path)
+    cache_path = cache_path or default_cache_path(svg_path)
+    ids, names = read_state_ids(svg_path)
+
+    svg = SVGMobject(svg_path)
+    chunks = []
+    for state_id in ids:
+        group = svg.id_to_vgroup_dict[state_id]
+        chunks.append(np.vstack([mob.points for mob in group.family_members_with_points()]))
+
+    offsets = np.cumsum([0] + [len(c) for c in chunks])
+    # Written under a temporary name and moved into place, so a process
+    # loading the cache concurrently never sees a partial file
+    tmp_path = f"{os.path.splitext(cache_path)[0]}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        version=CACHE_VERSION,
+        digest=file_digest(svg_path),
+        ids=np.array(ids),
+        names=np.array(names),
+        offsets=offsets,
+        points=np.vstack(chunks).astype(np.float32),
+        **state_geometry(chunks),
+    )
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+# (cache path, SVG digest) -> cache arrays, so every map built in a process
+# after the first skips reading the cache file
+LOADED_CACHES = {}
+
+
+def load_cache_data(svg_path, cache_path=None):
+    # The cache's arrays, rebuilding the cache when the SVG changed
+    svg_path = resolve_svg_path(svg_path)
+    cache_path = cache_path or default_cache_path(svg_path)
+    digest = file_digest(svg_path)
+    key = (os.path.abspath(cache_path), digest)
+    if key in LOADED_CACHES:
+        return LOADED_CACHES[key]
+
+    data = None
+    if os.path.exists(cache_path):
+        # Read every array before the file closes; long-lived farm workers
+        # would otherwise keep one handle open per load
+        with np.load(cache_path) as cached:
+            if int(cached["version"]) == CACHE_VERSION and str(cached["digest"]) == digest:
+                data = dict(cached)
+    if data is None:
+        build_state_cache(svg_path, cache_path)
+        with np.load(cache_path) as cached:
+            data = dict(cached)
+    LOADED_CACHES[key] = data
+    return data
+
+
+def load_state_cache(svg_path, cache_path=None):
+    # Returns {state id: (name, points)}
+    data = load_cache_data(svg_path, cache_path)
+    points = data["points"].astype(np.float64)
+    offsets = data["offsets"]
+    return {
+        str(state_id): (str(name), points[offsets[i]:offsets[i + 1]])
+        for i, (state_id, name) in enumerate(zip(data["ids"], data["names"]))
+    }
+
+
+def load_state_index(svg_path, cache_path=None):
+    data = load_cache_data(svg_path, cache_path)
+    ids = [str(state_id) for state_id in data["ids"]]
+    offsets, indices = data["adj_offsets"], data["adj_indices"]
+    neighbors = {
+        state_id: tuple(ids[j] for j in indices[offsets[i]:offsets[i + 1]])
+        for i, state_id in enumerate(ids)
+    }
+    return StateIndex(ids, data["centroids"], neighbors, data["distances"], data["hops"], data["nearest"],
+                      data["bounds"])
+
+
+if __name__ == "__main__":
+    # Build step: python us_map_cache.py [svg_path ...]
+    for path in sys.argv[1:] or ["us_states.svg"]:
+        print(build_state_cache(path))
@@ -1,32 +1,189 @@
 from manim import *
+import numpy as np
 import random
 
+from assets import image_asset, resolve_asset
+from labels import label
+from render_driver import mark_step
+from us_map_cache import load_state_cache, load_state_index
+from image_index import cached_states_with_image, dhash, most_common_state
+
+class RegionFillAnimation(Animation):
+    # Drives the fill color of many regions from one animation. By default
+    # every region fades to its row of target_rgbs; subclasses override
+    # region_rgbs to return an (N, 3) array of RGB values for a given alpha.
+    # Only regions whose color actually changed since the previous frame are
+    # touched.
+    def __init__(self, regions, mobject, target_rgbs=None, **kwargs):
+        self.regions = list(regions)
+        self.target_rgbs = None if target_rgbs is None else np.asarray(target_rgbs, dtype=float).reshape(-1, 3)
+        super().__init__(mobject, **kwargs)
+
+    def begin(self):
+        # Start colors are read when the animation starts playing, not when it
+        # is built, so fills from earlier plays are picked up
+        self.start_rgbs = np.array([color_to_rgb(r.get_fill_color()) for r in self.regions]).reshape(-1, 3)
+        self.current_rgbs = self.start_rgbs.copy()
+        super().begin()
+
+    def create_starting_mobject(self):
+        # Colors are interpolated from start_rgbs, so skip copying the whole map
+        return Mobject()
+
+    def region_rgbs(self, alpha):
+        if self.target_rgbs is None:
+            return self.start_rgbs
+        return self.start_rgbs + self.rate_func(alpha) * (self.target_rgbs - self.start_rgbs)
+
+    def interpolate_mobject(self, alpha):
+        rgbs = self.region_rgbs(alpha)
+        changed = np.flatnonzero(np.abs(rgbs - self.current_rgbs).max(axis=1) > 1 / 512)
+        for i in changed:
+            self.regions[i].set_fill(rgb_to_color(rgbs[i]), opacity=1)
+        self.current_rgbs[changed] = rgbs[changed]
+
+
+class StaggeredFill(RegionFillAnimation):
+    # Each region fades to its target color starting at its own delay in [0, 1]
+    # of the run time, taking fade_ratio of the run time to do so
+    def __init__(self, regions, mobject, target_rgbs, delays, fade_ratio=0.2, **kwargs):
+        super().__init__(regions, mobject, target_rgbs, **kwargs)
+        self.fade_ratio = fade_ratio
+        self.starts = np.asarray(delays, dtype=float) * (1 - fade_ratio)
+
+    def region_rgbs(self, alpha):
+        local = np.clip((alpha - self.starts) / self.fade_ratio, 0, 1)
+        local = np.array([self.rate_func(a) for a in local]) if self.rate_func is not linear else local
+        return self.start_rgbs + local[:, None] * (self.target_rgbs - self.start_rgbs)
+
+
+class ValueSeriesFill(RegionFillAnimation):
+    # Plays a (T, N) matrix of region values over the run time, linearly
+    # interpolating between time steps and mapping values onto a color ramp
+    def __init__(self, regions, mobject, values, low_color, high_color, vmin=None, vmax=None, **kwargs):
+        kwargs.setdefault("rate_func", linear)
+        super().__init__(regions, mobject, **kwargs)
+        values = np.asarray(values, dtype=float)
+        vmin = np.nanmin(values) if vmin is None else vmin
+        vmax = np.nanmax(values) if vmax is None else vmax
+        self.levels = np.nan_to_num(np.clip((values - vmin) / max(vmax - vmin, 1e-12), 0, 1))
+        self.low_rgb = color_to_rgb(low_color)
+        self.high_rgb = color_to_rgb(high_color)
+
+    def region_rgbs(self, alpha):
+        position = self.rate_func(alpha) * (len(self.levels) - 1)
+        i = min(int(position), len(self.levels) - 1)
+        j = min(i + 1, len(self.levels) - 1)
+        frac = position - i
+        level = self.levels[i] * (1 - frac) + self.levels[j] * frac
+        return self.low_rgb + level[:, None] * (self.high_rgb - self.low_rgb)
+
+
+def flow_curve_points(origin, targets, bundle=0.35, bend=0.15):
+    # Cubic bezier points (four per curve) from one origin to many targets. The
+    # first handle of every curve points along a shared trunk towards the
+    # targets' mean, which bundles the curves near the origin; the second
+    # handle bends each curve sideways so overlapping flows stay apart.
+    origin = np.asarray(origin, dtype=float)
+    targets = np.asarray(targets, dtype=float).reshape(-1, 3)
+    trunk = origin + bundle * (targets.mean(axis=0) - origin)
+    delta = targets - origin
+    normal = np.stack([-delta[:, 1], delta[:, 0], np.zeros(len(delta))], axis=1)
+    handle = targets - delta / 3 + bend * normal
+    starts = np.broadcast_to(origin, targets.shape)
+    return np.stack([starts, np.broadcast_to(trunk, targets.shape), handle, targets], axis=1).reshape(-1, 3)
+
+
+class FlowLayer(VGroup):
+    # Ad->state links aggregated per state and drawn as a handful of paths.
+    # Stroke width grows with the square root of each state's ad count and is
+    # quantized into width_bins levels; every level is one VMobject holding all
+    # of its curves as subpaths, so the mobject count and per-frame cost depend
+    # on the number of states and levels, never on the number of ads.
+    def __init__(self, origin, centers, counts, color=BLUE, min_width=1.0, max_width=8.0, width_bins=6, **kwargs):
+        super().__init__(**kwargs)
+        counts = np.asarray(counts, dtype=float)
+        self.counts = counts
+        # No ads, no paths
+        if not len(counts):
+            return
+        level = np.sqrt(counts / max(counts.max(), 1))
+        bins = np.minimum((level * width_bins).astype(int), width_bins - 1)
+        for b in np.unique(bins):
+            chosen = bins == b
+            width = min_width + (max_width - min_width) * (b + 1) / width_bins
+            path = VMobject(stroke_color=color, stroke_width=width, stroke_opacity=0.8)
+            path.set_points(flow_curve_points(origin, centers[chosen]))
+            self.add(path)
+
+
 class UnitedStatesMap(VGroup):
-    def __init__(self, svg_path="us_states.svg", scale_factor=2.5, default_color=GRAY, **kwargs):
+    def __init__(self, svg_path="us_states.svg", scale_factor=2.5, default_color=GRAY, cache_path=None, **kwargs):
         super().__init__(**kwargs)
         self.svg_path = svg_path
         self.default_color = default_color
         self.highlight_color = YELLOW
         self.scale_factor = scale_factor
 
-        self.map = SVGMobject(self.svg_path, fill_opacity=1, stroke_width=0.5)
-        self.map.scale(self.scale_factor)
-
-        state_codes = [
-            "MA", "MN", "MT", "ND", "HI", "ID", "WA", "AZ", "CA", "CO",
-            "NV", "NM", "OR", "UT", "WY", "AR", "IA", "KS", "MO", "NE",
-            "OK", "SD", "LA", "TX", "CT", "NH", "RI", "VT", "AL", "FL",
-            "GA", "MS", "SC", "IL", "IN", "KY", "NC", "OH", "TN", "VA",
-            "WI", "WV", "DE", "DC", "MD", "NJ", "NY", "PA", "ME", "MI", "AK"
-        ]
-
+        # Rebuild the states from the pre-parsed point cache instead of parsing
+        # the SVG; lookup is by SVG element id, not submobject order
         self.state_dict = {}
-        for state_obj, code in zip(self.map.submobjects, state_codes):
+        self.state_names = {}
+        for code, (name, points) in load_state_cache(self.svg_path, cache_path).items():
+            state_obj = VMobject(fill_opacity=1, stroke_color=BLACK, stroke_width=0.5)
+            state_obj.set_points(points)
             state_obj.set_fill(self.default_color, opacity=1)
             self.state_dict[code] = state_obj
+            self.state_names[code] = name
+
+        self.map = VGroup(*self.state_dict.values())
+        self.map.scale(self.scale_factor)
 
         self.add(self.map)
 
+        # Adjacency, distances and centroids come precomputed with the cache
+        self.index = load_state_index(self.svg_path, cache_path)
+        self.state_position = {code: i for i, code in enumerate(self.index.ids)}
+
+    def adjacent_states(self, state):
+        # States sharing a border with state
+        return self.index.neighbors[state]
+
+    def nearest_states(self, state, k=None):
+        # Other states ordered by centroid distance, closest first
+        order = self.index.nearest[self.state_position[state]]
+        return [self.index.ids[j] for j in order[:k]]
+
+    def distance(self, a, b):
+        # Centroid distance in map widths
+        return float(self.index.distances[self.state_position[a], self.state_position[b]])
+
+    def hops(self, a, b):
+        # Border crossings on the shortest route, or -1 across water
+        return int(self.index.hops[self.state_position[a], self.state_position[b]])
+
+    def is_nearby(self, a, b, max_hops=1):
+        return 0 <= self.hops(a, b) <= max_hops
+
+    def state_centers(self, states=None):
+        # Scene positions of state centroids, mapped from cache coordinates
+        # through the map's current placement in one step
+        rows = [self.state_position[s] for s in (self.index.ids if states is None else states)]
+        lo, hi = self.index.bounds
+        scale = self.map.width / (hi[0] - lo[0])
+        centers = np.zeros((len(rows), 3))
+        centers[:, :2] = (self.index.centroids[rows] - (lo + hi) / 2) * scale
+        return centers + self.map.get_center()
+
+    def flow_layer(self, ad_states, origin, **kwargs):
+        # Bin one state code per ad into per-state counts and draw the flows
+        # from origin, e.g. an ad image, to every state that received ads.
+        # Returns (layer, states in the layer).
+        ad_states = [s for s in ad_states if s in self.state_position]
+        states, counts = np.unique(np.array(ad_states, dtype=str), return_counts=True)
+        states = [str(s) for s in states]
+        return FlowLayer(origin, self.state_centers(states), counts, **kwargs), states
+
     def highlight_states(self, state_list, color=YELLOW):
         return [self.state_dict[s].animate.set_fill(color) for s in state_list if s in self.state_dict]
 
@@ -35,38 +192,87 @@ class UnitedStatesMap(VGroup):
             color = self.default_color
         return [self.state_dict[s].animate.set_fill(color, opacity=1) for s in state_list if s in self.state_dict]
 
+    def staggered_highlight(self, state_list=None, color=YELLOW, seed_state=None, fade_ratio=0.2, **kwargs):
+        # One animation highlighting many states on a delay schedule. States
+        # start in list order, or by distance from seed_state when given.
+        if state_list is None:
+            state_list = list(self.state_dict)
+        state_list = [s for s in state_list if s in self.state_dict]
+        regions = [self.state_dict[s] for s in state_list]
+
+        if seed_state is not None:
+            rows = [self.state_position[s] for s in state_list]
+            distance = self.index.distances[self.state_position[seed_state], rows].astype(float)
+            delays = distance / max(distance.max(), 1e-12)
+        else:
+            delays = np.arange(len(regions)) / max(len(regions) - 1, 1)
+
+        target_rgbs = np.tile(color_to_rgb(color), (len(regions), 1))
+        return StaggeredFill(regions, self, target_rgbs, delays, fade_ratio=fade_ratio, **kwargs)
+
+    def animate_values(self, series, low_color=None, high_color=None, vmin=None, vmax=None, **kwargs):
+        # series is a sequence of {state: value} snapshots, e.g. ad volume per
+        # week; states missing from a snapshot count as vmin
+        low_color = self.default_color if low_color is None else low_color
+        high_color = self.highlight_color if high_color is None else high_color
+        states = list(self.state_dict)
+        column = {s: i for i, s in enumerate(states)}
+        values = np.full((len(series), len(states)), np.nan)
+        for t, snapshot in enumerate(series):
+            for state, value in snapshot.items():
+                if state in column:
+                    values[t, column[state]] = value
+        regions = [self.state_dict[s] for s in states]
+        return ValueSeriesFill(regions, self, values, low_color, high_color, vmin=vmin, vmax=vmax, **kwargs)
+
 class HighlightMapScene(Scene):
+    def __init__(self, ad_states=None, ads_export=None, image="real_person.png", **kwargs):
+        super().__init__(**kwargs)
+        self.image = image
+        if ad_states is None and ads_export is not None:
+            # One state per ad in the export whose photo is a near-duplicate
+            # of the image shown
+            ad_states = cached_states_with_image(ads_export, dhash(resolve_asset(image)))
+        self.ad_states = ad_states or None
+
     def construct(self):
+        mark_step(self, "nearby_states")
         us_map = UnitedStatesMap(svg_path="us_states.svg")
         us_map.move_to(ORIGIN)
         self.play(FadeIn(us_map), run_time=0.5)
 
-        step1_text = Text("We may see the same image in multiple ads\nin nearby states.", font_size=24).to_edge(UP)
+        step1_text = label("We may see the same image in multiple ads\nin nearby states.", font_size=24).to_edge(UP)
         self.play(Write(step1_text))
 
-        real_person = ImageMobject("real_person.png").scale(0.5)
+        real_person = image_asset(self.image, scale=0.5)
         real_person.to_edge(RIGHT, buff=1)
         self.play(FadeIn(real_person), run_time=0.5)
 
-        nearby_states_sequence = ["AL", "TN", "AL", "GA", "MS", "AL"]
-        final_states = set()
-        arrows = []
-        for state in nearby_states_sequence:
-            state_center = us_map.state_dict[state].get_center()
-            arrow = Arrow(start=real_person.get_left(), end=state_center, buff=0.1, stroke_width=2, color=BLUE)
-            self.play(
-                us_map.state_dict[state].animate.set_fill(YELLOW),
-                Create(arrow),
-                run_time=0.5
-            )
-            arrows.append(arrow)
-            self.wait(0.3)
-            self.play(FadeOut(arrow), us_map.state_dict[state].animate.set_fill(us_map.default_color), run_time=0.5)
-            final_states.add(state)
-        
+        # Ads bounce between a home state and the states bordering it; with
+        # real data, ad_states holds one state code per matching ad, home is
+        # where most of them were posted and the farthest match away from it
+        # is the stolen copy. Without matches on the map, the story is told
+        # with the default states.
+        matched = [s for s in self.ad_states or () if s in us_map.state_position]
+        if not matched:
+            home = "AL"
+            nearby = [s for s in us_map.nearest_states(home) if us_map.is_nearby(home, s)][:3]
+            ad_states = [home, nearby[0], home, *nearby[1:], home]
+            stolen = "CA"
+        else:
+            home = most_common_state(matched)
+            ad_states = [s for s in matched if us_map.is_nearby(home, s)]
+            far = [s for s in matched if not us_map.is_nearby(home, s)]
+            stolen = max(far, key=lambda s: us_map.distance(home, s)) if far else us_map.nearest_states(home)[-1]
+        flows, final_states = us_map.flow_layer(ad_states, real_person.get_left())
+        self.play(Create(flows), us_map.staggered_highlight(final_states), run_time=1.5)
+        self.wait(0.3)
+        self.play(FadeOut(flows), us_map.staggered_highlight(final_states, us_map.default_color), run_time=0.5)
+
         self.play(FadeOut(step1_text))
 
-        link_text = Text("Through our algorithm, we will link these ads\nto be the same individual.", font_size=24).to_edge(UP)
+        mark_step(self, "linked")
+        link_text = label("Through our algorithm, we will link these ads\nto be the same individual.", font_size=24).to_edge(UP)
         self.play(Write(link_text))
         self.wait(1)
 
@@ -74,17 +280,18 @@ class HighlightMapScene(Scene):
         self.wait(1)
         self.play(FadeOut(link_text))
 
-        step2_text = Text("However, if a separate individual across the country\nsteals this image, we encounter an issue of false linkages.", font_size=24).to_edge(UP)
+        mark_step(self, "stolen_image")
+        step2_text = label("However, if a separate individual across the country\nsteals this image, we encounter an issue of false linkages.", font_size=24).to_edge(UP)
         self.play(Write(step2_text))
 
         new_image_position = us_map.get_left() + LEFT * 0.25
         self.play(real_person.animate.move_to(new_image_position), run_time=1.5)
 
-        ca_center = us_map.state_dict["CA"].get_center()
-        ca_arrow = Arrow(start=real_person.get_right(), end=ca_center, buff=0.1, stroke_width=2, color=BLUE)
+        stolen_center = us_map.state_centers([stolen])[0]
+        stolen_arrow = Arrow(start=real_person.get_right(), end=stolen_center, buff=0.1, stroke_width=2, color=BLUE)
         self.play(
-            us_map.state_dict["CA"].animate.set_fill(YELLOW),
-            Create(ca_arrow),
+            us_map.state_dict[stolen].animate.set_fill(YELLOW),
+            Create(stolen_arrow),
             run_time=1
         )
 
@@ -92,18 +299,18 @@ class HighlightMapScene(Scene):
         self.play(FadeOut(step2_text))
         self.wait(0.5)
 
-        step3_text = Text("Generic content, scams, and stolen images\ntie up individuals nationwide", font_size=24).to_edge(UP)
+        mark_step(self, "nationwide")
+        step3_text = label("Generic content, scams, and stolen images\ntie up individuals nationwide", font_size=24).to_edge(UP)
         self.play(Write(step3_text))
 
-        snapchat_logo = ImageMobject("snapchat.jpg").scale(0.5).to_corner(DL, buff=1)
-        generic_text = ImageMobject("generic_text.png").scale(0.5).to_corner(DR, buff=1)
+        snapchat_logo = image_asset("snapchat.jpg", scale=0.5).to_corner(DL, buff=1)
+        generic_text = image_asset("generic_text.png", scale=0.5).to_corner(DR, buff=1)
         self.play(FadeIn(snapchat_logo), FadeIn(generic_text), run_time=0.5)
 
         all_states = list(us_map.state_dict.keys())
         random.shuffle(all_states)
 
-        for state in all_states:
-            self.play(*us_map.highlight_states([state]), run_time=0.05)
+        self.play(us_map.staggered_highlight(all_states, fade_ratio=0.05), run_time=0.05 * len(all_states))
 
         self.wait(1)
 
@@ -111,7 +318,7 @@ class HighlightMapScene(Scene):
             FadeOut(snapchat_logo), 
             FadeOut(generic_text), 
             FadeOut(real_person), 
-            FadeOut(ca_arrow),
+            FadeOut(stolen_arrow),
             run_time=1
         )
         self.play(FadeOut(us_map), FadeOut(step3_text), run_time=1)